@@ -1,23 +1,28 @@
-import os
-import google.generativeai as genai
-
-# Load your Gemini key into both conventions:
-gemini_key = os.getenv("GEMINI_API_KEY")
-os.environ["GOOGLE_API_KEY"] = gemini_key  # langchain_google_genai expects this
-genai.api_key = gemini_key
-
 import asyncio
+import os
 
+import google.generativeai as genai
 import nest_asyncio
 import streamlit as st
-import os
-import google.generativeai as genai
+
+from open_notebook.domain.identity_map import unit_of_work
 from open_notebook.domain.models import DefaultModels, model_manager
-from open_notebook.domain.notebook import Note, Notebook, text_search, vector_search
+from open_notebook.domain.notebook import (
+    Note,
+    Notebook,
+    hybrid_search,
+    text_search,
+    vector_search,
+)
 from open_notebook.graphs.ask import graph as ask_graph
 from pages.components.model_selector import model_selector
 from pages.stream_app.utils import convert_source_references, setup_page
 
+# Load your Gemini key into both conventions:
+gemini_key = os.getenv("GEMINI_API_KEY")
+os.environ["GOOGLE_API_KEY"] = gemini_key  # langchain_google_genai expects this
+genai.api_key = gemini_key
+
 nest_asyncio.apply()
 genai.api_key = os.getenv("GEMINI_API_KEY")
 setup_page("🔍 Search")
@@ -125,7 +130,8 @@ with ask_tab:
         st.session_state["ask_results"]["question"] = question
         st.session_state["ask_results"]["answer"] = None
 
-        asyncio.run(stream_results())
+        with unit_of_work():
+            asyncio.run(stream_results())
 
     if st.session_state["ask_results"].get("answer"):
         with st.container(border=True):
@@ -154,25 +160,50 @@ with search_tab:
             )
             search_type = "Text Search"
         else:
-            search_type = st.radio("Search Type", ["Text Search", "Vector Search"])
+            search_type = st.radio(
+                "Search Type", ["Hybrid Search", "Text Search", "Vector Search"]
+            )
         search_sources = st.checkbox("Search Sources", value=True)
         search_notes = st.checkbox("Search Notes", value=True)
+        search_notebook = st.selectbox(
+            "Notebook",
+            [None] + Notebook.get_all(),
+            format_func=lambda x: x.name if x else "All notebooks",
+        )
+        notebook_id = search_notebook.id if search_notebook else None
         if st.button("Search"):
             if search_type == "Text Search":
                 st.write(f"Searching for {search_term}")
                 st.session_state["search_results"] = text_search(
-                    search_term, 100, search_sources, search_notes
+                    search_term,
+                    100,
+                    search_sources,
+                    search_notes,
+                    notebook_id=notebook_id,
                 )
             elif search_type == "Vector Search":
                 st.write(f"Searching for {search_term}")
                 st.session_state["search_results"] = vector_search(
-                    search_term, 100, search_sources, search_notes
+                    search_term,
+                    100,
+                    search_sources,
+                    search_notes,
+                    notebook_id=notebook_id,
+                )
+            elif search_type == "Hybrid Search":
+                st.write(f"Searching for {search_term}")
+                st.session_state["search_results"] = hybrid_search(
+                    search_term,
+                    100,
+                    search_sources,
+                    search_notes,
+                    notebook_id=notebook_id,
                 )
 
         search_results = st.session_state["search_results"].copy()
         for item in search_results:
             item["final_score"] = item.get(
-                "relevance", item.get("similarity", item.get("score", 0))
+                "score", item.get("relevance", item.get("similarity", 0))
             )
 
         # Sort search results by final_score in descending order
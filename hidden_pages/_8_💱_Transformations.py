@@ -1,11 +1,7 @@
+import asyncio
 import os
-import google.generativeai as genai
-
-# Load your Gemini key into both conventions:
-gemini_key = os.getenv("GEMINI_API_KEY")
-os.environ["GOOGLE_API_KEY"] = gemini_key  # langchain_google_genai expects this
-genai.api_key = gemini_key
 
+import google.generativeai as genai
 import streamlit as st
 
 from open_notebook.domain.transformation import DefaultPrompts, Transformation
@@ -13,6 +9,11 @@ from open_notebook.graphs.transformation import graph as transformation_graph
 from pages.components.model_selector import model_selector
 from pages.stream_app.utils import setup_page
 
+# Load your Gemini key into both conventions:
+gemini_key = os.getenv("GEMINI_API_KEY")
+os.environ["GOOGLE_API_KEY"] = gemini_key  # langchain_google_genai expects this
+genai.api_key = gemini_key
+
 setup_page("🧩 Transformations")
 
 transformations_tab, playground_tab = st.tabs(["🧩 Transformations", "🛝 Playground"])
@@ -95,6 +96,27 @@ with transformations_tab:
                     "You can use the prompt to summarize, expand, extract insights and much more. Example: `Translate this text to French`. For inspiration, check out this [great resource](https://github.com/danielmiessler/fabric/tree/main/patterns)."
                 )
 
+                mode = st.radio(
+                    "Mode",
+                    ["single", "map_reduce"],
+                    index=["single", "map_reduce"].index(transformation.mode),
+                    format_func=lambda m: {
+                        "single": "Whole text in one call",
+                        "map_reduce": "Map-reduce: run on chunks in parallel, then combine",
+                    }[m],
+                    key=f"{transformation.id}_mode",
+                    horizontal=True,
+                    help="Map-reduce is faster and cheaper for very long sources, like books",
+                )
+                reduce_prompt = transformation.reduce_prompt
+                if mode == "map_reduce":
+                    reduce_prompt = st.text_area(
+                        "Reduce Prompt (combines the results of the chunks, a generic one is used when empty)",
+                        transformation.reduce_prompt or "",
+                        key=f"{transformation.id}_reduce_prompt",
+                        height=150,
+                    )
+
                 apply_default = st.checkbox(
                     "Suggest by default on new sources",
                     transformation.apply_default,
@@ -106,6 +128,8 @@ with transformations_tab:
                     transformation.description = description
                     transformation.prompt = prompt
                     transformation.apply_default = apply_default
+                    transformation.mode = mode
+                    transformation.reduce_prompt = reduce_prompt or None
                     st.toast(f"Transformation '{name}' saved successfully!")
                     transformation.save()
                     st.rerun()
@@ -145,11 +169,13 @@ with playground_tab:
     input_text = st.text_area("Enter some text", height=200)
 
     if st.button("Run"):
-        output = transformation_graph.invoke(
-            dict(
-                input_text=input_text,
-                transformation=transformation,
-            ),
-            config=dict(configurable={"model_id": model.id}),
+        output = asyncio.run(
+            transformation_graph.ainvoke(
+                dict(
+                    input_text=input_text,
+                    transformation=transformation,
+                ),
+                config=dict(configurable={"model_id": model.id}),
+            )
         )
         st.markdown(output["output"])
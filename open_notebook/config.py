@@ -23,6 +23,15 @@ sqlite_folder = f"{DATA_FOLDER}/sqlite-db"
 os.makedirs(sqlite_folder, exist_ok=True)
 LANGGRAPH_CHECKPOINT_FILE = f"{sqlite_folder}/checkpoints.sqlite"
 
+# EMBEDDING CACHE FILE
+EMBEDDING_CACHE_FILE = f"{sqlite_folder}/embedding_cache.sqlite"
+
+# BACKGROUND JOB QUEUE FILE
+JOBS_FILE = f"{sqlite_folder}/jobs.sqlite"
+
+# IN-PROCESS VECTOR INDEX FOLDER (vector_search backend: numpy)
+VECTOR_INDEX_FOLDER = f"{DATA_FOLDER}/vector-index"
+
 # UPLOADS FOLDER
 UPLOADS_FOLDER = f"{DATA_FOLDER}/uploads"
 os.makedirs(UPLOADS_FOLDER, exist_ok=True)
@@ -0,0 +1,142 @@
+import json
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+from sblpy.connection import SurrealSyncConnection
+
+from open_notebook.database.pool import connect_from_env
+
+# (table, record id, action). A RESET action with no table/record is sent after every
+# reconnection, as notifications may have been missed while disconnected.
+Listener = Callable[[Optional[str], Optional[str], str], None]
+
+
+def decode_notification(frame: Any) -> Optional[Tuple[str, str]]:
+    """
+    Decodes a frame read from the websocket of a SurrealSyncConnection, which speaks
+    the JSON flavour of the SurrealDB RPC protocol, into (record id, action).
+
+    Live notifications carry no request id and a `result` object:
+    {"result": {"id": <live query uuid>, "action": "UPDATE", "record": "note:x",
+    "result": {"id": "note:x"}}}. SurrealDB 1.x omits `record`, the id is then read
+    from `result`. Replies to queries (with a request id) return None.
+    """
+    if isinstance(frame, (bytes, bytearray)):
+        frame = frame.decode("utf-8")
+    try:
+        message = json.loads(frame) if isinstance(frame, str) else frame
+    except ValueError:
+        return None
+    if not isinstance(message, dict) or message.get("id") is not None:
+        return None
+    notification = message.get("result")
+    if not isinstance(notification, dict) or "action" not in notification:
+        return None
+    record: Any = notification.get("record")
+    if record is None and isinstance(notification.get("result"), dict):
+        record = notification["result"].get("id")
+    elif record is None and isinstance(notification.get("result"), str):
+        # 1.x deletions
+        record = notification["result"]
+    if not record:
+        return None
+    return str(record), str(notification["action"])
+
+
+class LiveInvalidationBus:
+    """
+    Subscribes to `LIVE SELECT` queries on a dedicated connection and forwards every
+    change notification to the registered listeners, from a background thread.
+    """
+
+    def __init__(
+        self,
+        tables: Sequence[str],
+        connect: Callable[[], SurrealSyncConnection] = connect_from_env,
+        reconnect_delay: float = 5.0,
+    ):
+        self.tables = list(tables)
+        self._connect = connect
+        self.reconnect_delay = reconnect_delay
+        self._listeners: List[Listener] = []
+        self._connection: Optional[SurrealSyncConnection] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="live-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._connection is not None:
+            try:
+                # Unblocks the pending recv()
+                self._connection.socket.close()
+            except Exception as e:
+                logger.debug(f"Error closing live query connection: {e}")
+
+    def _emit(self, table: Optional[str], record_id: Optional[str], action: str):
+        for listener in self._listeners:
+            try:
+                listener(table, record_id, action)
+            except Exception as e:
+                logger.error(f"Live invalidation listener failed: {e}")
+
+    def handle_message(self, frame: Any) -> None:
+        """Emits a websocket frame if it is a live notification"""
+        decoded = decode_notification(frame)
+        if decoded is None:
+            return
+        record_id, action = decoded
+        self._emit(record_id.split(":")[0], record_id, action)
+
+    def _run(self) -> None:
+        connected_before = False
+        while not self._stopped.is_set():
+            try:
+                self._connection = self._connect()
+                for table in self.tables:
+                    # Only the id, listeners are told which record changed and read
+                    # it again if they need it
+                    self._connection.query(f"LIVE SELECT id FROM {table};")
+                logger.info(f"Listening for changes on {', '.join(self.tables)}")
+                # Nothing was cached from notifications before the first connection,
+                # resetting then would only throw away what warm_up just loaded
+                if connected_before:
+                    self._emit(None, None, "RESET")
+                connected_before = True
+                while not self._stopped.is_set():
+                    self.handle_message(self._connection.socket.recv())
+            except Exception as e:
+                if self._stopped.is_set():
+                    break
+                logger.warning(
+                    f"Live query connection lost, reconnecting in {self.reconnect_delay}s: {e}"
+                )
+                self._stopped.wait(self.reconnect_delay)
+            finally:
+                if self._connection is not None:
+                    try:
+                        self._connection.socket.close()
+                    except Exception:
+                        pass
+                    self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(
+            running=self.running, tables=self.tables, listeners=len(self._listeners)
+        )
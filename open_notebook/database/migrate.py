@@ -1,4 +1,7 @@
 import os
+import re
+import threading
+from typing import Set
 
 from loguru import logger
 from sblpy.connection import SurrealSyncConnection
@@ -6,6 +9,23 @@ from sblpy.migrations.db_processes import get_latest_version
 from sblpy.migrations.migrations import Migration
 from sblpy.migrations.runner import MigrationRunner
 
+from open_notebook.database.repository import repo_query
+
+# Tables searched by fn::vector_search and the name of their HNSW index
+VECTOR_INDEXES = {
+    "source_embedding": "idx_source_embedding_vector",
+    "source_insight": "idx_source_insight_vector",
+    "note": "idx_note_vector",
+}
+# Neighbours returned by each HNSW index, the KNN operator of fn::vector_search
+# only takes literals. Larger searches go through fn::vector_search_exact.
+VECTOR_SEARCH_MAX_RESULTS = 100
+
+_indexed_dimensions: Set[int] = set()
+_index_lock = threading.Lock()
+_building_dimensions: Set[int] = set()
+_building_lock = threading.Lock()
+
 
 class MigrationManager:
     def __init__(self):
@@ -25,6 +45,11 @@ class MigrationManager:
             Migration.from_file("migrations/4.surrealql"),
             Migration.from_file("migrations/5.surrealql"),
             Migration.from_file("migrations/6.surrealql"),
+            Migration.from_file("migrations/7.surrealql"),
+            Migration.from_file("migrations/8.surrealql"),
+            Migration.from_file("migrations/9.surrealql"),
+            Migration.from_file("migrations/10.surrealql"),
+            Migration.from_file("migrations/11.surrealql"),
         ]
         self.down_migrations = [
             Migration.from_file(
@@ -35,6 +60,11 @@ class MigrationManager:
             Migration.from_file("migrations/4_down.surrealql"),
             Migration.from_file("migrations/5_down.surrealql"),
             Migration.from_file("migrations/6_down.surrealql"),
+            Migration.from_file("migrations/7_down.surrealql"),
+            Migration.from_file("migrations/8_down.surrealql"),
+            Migration.from_file("migrations/9_down.surrealql"),
+            Migration.from_file("migrations/10_down.surrealql"),
+            Migration.from_file("migrations/11_down.surrealql"),
         ]
         self.runner = MigrationRunner(
             up_migrations=self.up_migrations,
@@ -70,3 +100,69 @@ class MigrationManager:
                 logger.error(f"Migration failed: {str(e)}")
         else:
             logger.info("Database is already at the latest version")
+
+
+def _index_dimension(table: str, index_name: str):
+    result = repo_query(f"INFO FOR TABLE {table};")
+    info = result[0] if isinstance(result, list) and result else result
+    definition = ((info or {}).get("indexes") or {}).get(index_name)
+    if not definition:
+        return None
+    match = re.search(r"DIMENSION (\d+)", definition)
+    return int(match.group(1)) if match else None
+
+
+def ensure_vector_indexes(dimension: int) -> None:
+    """
+    Makes sure the HNSW indexes used by fn::vector_search exist for the given
+    embedding dimension. Indexes built for another dimension (after switching
+    embedding models) are dropped and rebuilt.
+    """
+    if dimension in _indexed_dimensions:
+        return
+    with _index_lock:
+        if dimension in _indexed_dimensions:
+            return
+        for table, index_name in VECTOR_INDEXES.items():
+            current = _index_dimension(table, index_name)
+            if current == dimension:
+                continue
+            if current is not None:
+                logger.warning(
+                    f"Rebuilding {index_name} for dimension {dimension} (was {current}). Content embedded with the previous model needs to be embedded again."
+                )
+                repo_query(f"REMOVE INDEX IF EXISTS {index_name} ON TABLE {table};")
+            logger.info(f"Building vector index {index_name} ({dimension} dimensions)")
+            repo_query(
+                f"DEFINE INDEX IF NOT EXISTS {index_name} ON TABLE {table} FIELDS embedding HNSW DIMENSION {dimension} DIST COSINE;"
+            )
+        _indexed_dimensions.clear()
+        _indexed_dimensions.add(dimension)
+
+
+def vector_indexes_ready(dimension: int) -> bool:
+    """Whether the HNSW indexes are known to exist for this embedding dimension"""
+    return dimension in _indexed_dimensions
+
+
+def build_vector_indexes_in_background(dimension: int) -> None:
+    """
+    Runs ensure_vector_indexes on a background thread, building an index over a
+    large table takes a while. Searches use fn::vector_search_exact meanwhile.
+    """
+    # Not _index_lock, which is held for the whole build
+    with _building_lock:
+        if dimension in _indexed_dimensions or dimension in _building_dimensions:
+            return
+        _building_dimensions.add(dimension)
+
+    def build() -> None:
+        try:
+            ensure_vector_indexes(dimension)
+        except Exception as e:
+            logger.error(f"Could not build the vector indexes: {e}")
+        finally:
+            with _building_lock:
+                _building_dimensions.discard(dimension)
+
+    threading.Thread(target=build, name="vector-index-build", daemon=True).start()
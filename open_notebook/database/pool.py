@@ -0,0 +1,278 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from loguru import logger
+from sblpy.connection import SurrealSyncConnection
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    reconnects: int = 0
+    evictions: int = 0
+    failed_health_checks: int = 0
+
+
+_WRITE_KEYWORDS = re.compile(
+    r"\b(CREATE|UPDATE|UPSERT|INSERT|DELETE|RELATE|DEFINE|REMOVE|BEGIN|COMMIT|LIVE|KILL)\b",
+    re.IGNORECASE,
+)
+
+
+def is_read_only(query_str: str) -> bool:
+    """
+    Whether running the query twice is harmless. Anything that may write, even only
+    by mentioning a write keyword, is not.
+    """
+    statement = query_str.lstrip()[:6].upper()
+    return statement in ("SELECT", "RETURN") and not _WRITE_KEYWORDS.search(query_str)
+
+
+class _PooledConnection:
+    def __init__(self, connection: SurrealSyncConnection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def close(self) -> None:
+        try:
+            self.connection.socket.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled connection: {e}")
+
+
+def connect_from_env() -> SurrealSyncConnection:
+    return SurrealSyncConnection(
+        host=os.environ["SURREAL_ADDRESS"],
+        port=int(os.environ["SURREAL_PORT"]),
+        user=os.environ["SURREAL_USER"],
+        password=os.environ["SURREAL_PASS"],
+        namespace=os.environ["SURREAL_NAMESPACE"],
+        database=os.environ["SURREAL_DATABASE"],
+        max_size=2.2**20,
+        encrypted=False,  # Set to True if using SSL
+    )
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of signed-in SurrealDB connections.
+
+    Connections are created lazily up to `max_size`. Idle connections older than
+    `idle_timeout` seconds are closed, and connections that sat idle for longer than
+    `health_check_interval` seconds are pinged before being handed out again.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], SurrealSyncConnection] = connect_from_env,
+        max_size: int = 10,
+        idle_timeout: float = 300.0,
+        acquire_timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+    ):
+        if max_size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self._connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self._idle: List[_PooledConnection] = []
+        self._in_use = 0
+        self._condition = threading.Condition(threading.Lock())
+        self._stats = PoolStats()
+
+    @property
+    def size(self) -> int:
+        with self._condition:
+            return self._in_use + len(self._idle)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            data = asdict(self._stats)
+            data["in_use"] = self._in_use
+            data["idle"] = len(self._idle)
+            data["max_size"] = self.max_size
+        return data
+
+    def _evict_idle(self) -> List[_PooledConnection]:
+        # Must be called with the condition held
+        now = time.monotonic()
+        expired = [c for c in self._idle if now - c.last_used > self.idle_timeout]
+        if expired:
+            self._idle = [c for c in self._idle if c not in expired]
+            self._stats.evictions += len(expired)
+        return expired
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        try:
+            pooled.connection.query("RETURN true;")
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            with self._condition:
+                self._stats.failed_health_checks += 1
+            return False
+
+    def _acquire(self) -> _PooledConnection:
+        deadline = time.monotonic() + self.acquire_timeout
+        waited = False
+        wait_started = 0.0
+        with self._condition:
+            while True:
+                for expired in self._evict_idle():
+                    expired.close()
+                if self._idle:
+                    pooled = self._idle.pop()
+                    self._in_use += 1
+                    self._stats.hits += 1
+                    break
+                if self._in_use < self.max_size:
+                    self._in_use += 1
+                    self._stats.misses += 1
+                    pooled = None
+                    break
+                if not waited:
+                    waited = True
+                    wait_started = time.monotonic()
+                    self._stats.waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"Timed out waiting for a database connection ({self.max_size} in use)"
+                    )
+                self._condition.wait(remaining)
+            if waited:
+                self._stats.wait_time += time.monotonic() - wait_started
+
+        if pooled is not None:
+            if time.monotonic() - pooled.last_used < self.health_check_interval:
+                return pooled
+            if self._is_healthy(pooled):
+                return pooled
+            pooled.close()
+            with self._condition:
+                self._stats.reconnects += 1
+
+        try:
+            return _PooledConnection(self._connect())
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+    def _release(self, pooled: _PooledConnection) -> None:
+        pooled.last_used = time.monotonic()
+        with self._condition:
+            self._in_use -= 1
+            self._idle.append(pooled)
+            self._condition.notify()
+
+    def _discard(self, pooled: _PooledConnection) -> None:
+        pooled.close()
+        self._release_slot()
+
+    @contextmanager
+    def connection(self):
+        pooled = self._acquire()
+        try:
+            yield pooled.connection
+        except BaseException:
+            # The connection state is unknown after a failure, only keep it if it still responds
+            if self._is_healthy(pooled):
+                self._release(pooled)
+            else:
+                self._discard(pooled)
+            raise
+        else:
+            self._release(pooled)
+
+    def query(self, query_str: str, vars: Optional[Dict[str, Any]] = None):
+        """
+        Runs a query on a pooled connection.
+        If the connection turns out to be broken, it is replaced and a read only query
+        is retried once. Writes are not, the server may have applied them before the
+        connection dropped.
+        """
+        pooled = self._acquire()
+        try:
+            result = pooled.connection.query(query_str, vars)
+        except Exception:
+            if self._is_healthy(pooled):
+                # The connection is fine, so the query itself failed
+                self._release(pooled)
+                raise
+            if not is_read_only(query_str):
+                logger.warning("Database connection lost during a write, not retrying")
+                self._discard(pooled)
+                raise
+            logger.warning("Database connection lost, reconnecting")
+            pooled.close()
+            with self._condition:
+                self._stats.reconnects += 1
+            try:
+                pooled = _PooledConnection(self._connect())
+            except Exception:
+                self._release_slot()
+                raise
+            try:
+                result = pooled.connection.query(query_str, vars)
+            except Exception:
+                self._discard(pooled)
+                raise
+        self._release(pooled)
+        return result
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            pooled.close()
+
+
+_pool: Optional[ConnectionPool] = None
+_async_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def _pool_from_env(size_var: str) -> ConnectionPool:
+    return ConnectionPool(
+        max_size=int(os.environ.get(size_var, 10)),
+        idle_timeout=float(os.environ.get("SURREAL_POOL_IDLE_TIMEOUT", 300)),
+        acquire_timeout=float(os.environ.get("SURREAL_POOL_ACQUIRE_TIMEOUT", 30)),
+        health_check_interval=float(
+            os.environ.get("SURREAL_POOL_HEALTH_CHECK_INTERVAL", 30)
+        ),
+    )
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _pool_from_env("SURREAL_POOL_SIZE")
+    return _pool
+
+
+def get_async_pool() -> ConnectionPool:
+    """Pool used by the async repository functions, sized by SURREAL_ASYNC_POOL_SIZE"""
+    global _async_pool
+    if _async_pool is None:
+        with _pool_lock:
+            if _async_pool is None:
+                _async_pool = _pool_from_env("SURREAL_ASYNC_POOL_SIZE")
+    return _async_pool
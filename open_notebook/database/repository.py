@@ -1,38 +1,31 @@
+import asyncio
 import os
 from contextlib import contextmanager
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from loguru import logger
-from sblpy.connection import SurrealSyncConnection
+
+from open_notebook.database.pool import get_async_pool, get_pool
 
 
 @contextmanager
 def db_connection():
-    connection = SurrealSyncConnection(
-        host=os.environ["SURREAL_ADDRESS"],
-        port=int(os.environ["SURREAL_PORT"]),
-        user=os.environ["SURREAL_USER"],
-        password=os.environ["SURREAL_PASS"],
-        namespace=os.environ["SURREAL_NAMESPACE"],
-        database=os.environ["SURREAL_DATABASE"],
-        max_size=2.2**20,
-        encrypted=False,  # Set to True if using SSL
-    )
-    try:
+    with get_pool().connection() as connection:
         yield connection
-    finally:
-        connection.socket.close()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Returns the connection pool hit/miss/wait counters"""
+    return get_pool().stats()
 
 
 def repo_query(query_str: str, vars: Optional[Dict[str, Any]] = None):
-    with db_connection() as connection:
-        try:
-            result = connection.query(query_str, vars)
-            return result
-        except Exception as e:
-            logger.critical(f"Query: {query_str}")
-            logger.exception(e)
-            raise
+    try:
+        return get_pool().query(query_str, vars)
+    except Exception as e:
+        logger.critical(f"Query: {query_str}")
+        logger.exception(e)
+        raise
 
 
 def repo_create(table: str, data: Dict[str, Any]):
@@ -45,12 +38,70 @@ def repo_upsert(table: str, data: Dict[str, Any]):
     return repo_query(query)
 
 
+def _insert_many_query(
+    table: str, rows: List[Dict[str, Any]], record_fields: Sequence[str]
+) -> Tuple[str, Dict[str, Any]]:
+    # Record links can't be passed as query variables (they would be stored as
+    # strings), so they are written inline and everything else is bound as a variable
+    vars: Dict[str, Any] = {}
+    literals = []
+    for idx, row in enumerate(rows):
+        fields = []
+        for key, value in row.items():
+            if key in record_fields:
+                fields.append(f'"{key}": {value}')
+            else:
+                var_name = f"r{idx}_{key}"
+                vars[var_name] = value
+                fields.append(f'"{key}": ${var_name}')
+        literals.append("{" + ", ".join(fields) + "}")
+    query = f"""
+        BEGIN TRANSACTION;
+        INSERT INTO {table} [{", ".join(literals)}];
+        COMMIT TRANSACTION;
+        """
+    return query, vars
+
+
+def repo_insert_many(
+    table: str,
+    rows: List[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    record_fields: Sequence[str] = (),
+) -> List[Any]:
+    """
+    Inserts rows in batches, each batch as a single INSERT inside a transaction.
+
+    Args:
+        table (str): The table to insert into.
+        rows (List[Dict]): The records to insert.
+        batch_size (int): Rows per transaction. Defaults to SURREAL_INSERT_BATCH_SIZE or 100.
+        record_fields (Sequence[str]): Fields holding record ids (eg. "source").
+
+    Returns:
+        List: The query results of each batch.
+    """
+    batch_size = batch_size or int(os.environ.get("SURREAL_INSERT_BATCH_SIZE", 100))
+    results = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        results.append(repo_query(*_insert_many_query(table, batch, record_fields)))
+    return results
+
+
 def repo_update(id: str, data: Dict[str, Any]):
     query = "UPDATE $id CONTENT $data;"
     vars = {"id": id, "data": data}
     return repo_query(query, vars)
 
 
+def repo_merge(id: str, data: Dict[str, Any]):
+    """Updates only the given fields, leaving the rest of the record untouched"""
+    query = "UPDATE $id MERGE $data;"
+    vars = {"id": id, "data": data}
+    return repo_query(query, vars)
+
+
 def repo_delete(id: str):
     query = "DELETE $id;"
     vars = {"id": id}
@@ -61,3 +112,69 @@ def repo_relate(source: str, relationship: str, target: str, data: Optional[Dict
     query = f"RELATE {source}->{relationship}->{target} CONTENT $content;"
     result = repo_query(query, {"content": data})
     return result
+
+
+# Async API
+# sblpy only ships a blocking websocket client, so the async functions run queries on
+# their own connection pool from worker threads, keeping the event loop free while
+# concurrent graph branches wait on the database.
+
+
+async def arepo_query(query_str: str, vars: Optional[Dict[str, Any]] = None):
+    try:
+        return await asyncio.to_thread(get_async_pool().query, query_str, vars)
+    except Exception as e:
+        logger.critical(f"Query: {query_str}")
+        logger.exception(e)
+        raise
+
+
+async def arepo_create(table: str, data: Dict[str, Any]):
+    query = f"CREATE {table} CONTENT {data};"
+    return await arepo_query(query)
+
+
+async def arepo_upsert(table: str, data: Dict[str, Any]):
+    query = f"UPSERT {table} CONTENT {data};"
+    return await arepo_query(query)
+
+
+async def arepo_update(id: str, data: Dict[str, Any]):
+    query = "UPDATE $id CONTENT $data;"
+    vars = {"id": id, "data": data}
+    return await arepo_query(query, vars)
+
+
+async def arepo_merge(id: str, data: Dict[str, Any]):
+    query = "UPDATE $id MERGE $data;"
+    vars = {"id": id, "data": data}
+    return await arepo_query(query, vars)
+
+
+async def arepo_delete(id: str):
+    query = "DELETE $id;"
+    vars = {"id": id}
+    return await arepo_query(query, vars)
+
+
+async def arepo_relate(
+    source: str, relationship: str, target: str, data: Optional[Dict] = {}
+):
+    query = f"RELATE {source}->{relationship}->{target} CONTENT $content;"
+    return await arepo_query(query, {"content": data})
+
+
+async def arepo_insert_many(
+    table: str,
+    rows: List[Dict[str, Any]],
+    batch_size: Optional[int] = None,
+    record_fields: Sequence[str] = (),
+) -> List[Any]:
+    batch_size = batch_size or int(os.environ.get("SURREAL_INSERT_BATCH_SIZE", 100))
+    results = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start : start + batch_size]
+        results.append(
+            await arepo_query(*_insert_many_query(table, batch, record_fields))
+        )
+    return results
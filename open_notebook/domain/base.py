@@ -1,17 +1,45 @@
+import asyncio
+import threading
+import time
 from datetime import datetime
-from typing import Any, ClassVar, Dict, List, Optional, Type, TypeVar, cast
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    cast,
+)
 
 from loguru import logger
 from pydantic import BaseModel, ValidationError, field_validator, model_validator
 
+from open_notebook.config import CONFIG
 from open_notebook.database.repository import (
+    arepo_create,
+    arepo_merge,
+    arepo_query,
+    arepo_relate,
+    arepo_update,
     repo_create,
     repo_delete,
+    repo_merge,
     repo_query,
     repo_relate,
     repo_update,
     repo_upsert,
 )
+from open_notebook.domain.identity_map import (
+    cached_query,
+    current_identity_map,
+    invalidate,
+)
 from open_notebook.exceptions import (
     DatabaseOperationError,
     InvalidInputError,
@@ -21,14 +49,81 @@ from open_notebook.exceptions import (
 T = TypeVar("T", bound="ObjectModel")
 
 
+def settings_ttl() -> float:
+    """Seconds a RecordModel is served from memory before it is refreshed"""
+    return float((CONFIG.get("settings_cache") or {}).get("ttl_seconds", 60))
+
+
 class ObjectModel(BaseModel):
     id: Optional[str] = None
     table_name: ClassVar[str] = ""
     created: Optional[datetime] = None
     updated: Optional[datetime] = None
+    # Heavy columns left out of get() and get_all(). Those that are model fields are
+    # read from the database on first access, the others (like embeddings) never are.
+    lazy_fields: ClassVar[Tuple[str, ...]] = ()
+
+    @classmethod
+    def _select(cls, target: str, omit: Sequence[str]) -> str:
+        projection = f"* OMIT {', '.join(omit)}" if omit else "*"
+        return f"SELECT {projection} FROM {target}"
+
+    @classmethod
+    def from_record(
+        cls: Type[T], record: Dict[str, Any], omit: Sequence[str] = ()
+    ) -> T:
+        """Builds an object from a record that was selected without the `omit` fields"""
+        obj = cls(**record)
+        for name in omit:
+            if name in cls.model_fields and name not in record:
+                # Left out of __dict__ so that the first access loads it
+                obj.__dict__.pop(name, None)
+        return obj
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached when the attribute is not set, as for unloaded lazy fields
+        cls = type(self)
+        if name in cls.lazy_fields and name in cls.model_fields:
+            self.__dict__[name] = self._load_field(name)
+            return self.__dict__[name]
+        return super().__getattr__(name)  # type: ignore[misc]
+
+    def _load_field(self, name: str) -> Any:
+        if self.id is None:
+            return None
+        logger.debug(f"Loading {name} of {self.id}")
+        result = cached_query(
+            ("lazy_field", self.id, name),
+            (self.__class__.table_name,),
+            lambda: repo_query(f"SELECT VALUE {name} FROM {self.id}"),
+        )
+        return result[0] if result else None
+
+    async def aload_lazy_fields(self) -> None:
+        """
+        Reads the lazy fields not loaded yet in a single query, without blocking the
+        event loop as their first access would. For async code about to use them.
+        """
+        names = self.unloaded_fields()
+        if not names or self.id is None:
+            return
+        result = await arepo_query(f"SELECT {', '.join(names)} FROM {self.id}")
+        record = result[0] if result else {}
+        for name in names:
+            self.__dict__[name] = record.get(name)
+
+    def unloaded_fields(self) -> List[str]:
+        cls = type(self)
+        return [
+            name
+            for name in cls.lazy_fields
+            if name in cls.model_fields and name not in self.__dict__
+        ]
 
     @classmethod
-    def get_all(cls: Type[T], order_by=None) -> List[T]:
+    def get_all(
+        cls: Type[T], order_by=None, omit: Optional[Sequence[str]] = None
+    ) -> List[T]:
         try:
             # If called from a specific subclass, use its table_name
             if cls.table_name:
@@ -45,11 +140,13 @@ class ObjectModel(BaseModel):
             else:
                 order = ""
 
-            result = repo_query(f"SELECT * FROM {table_name} {order}")
+            if omit is None:
+                omit = target_class.lazy_fields
+            result = repo_query(f"{target_class._select(table_name, omit)} {order}")
             objects = []
             for obj in result:
                 try:
-                    objects.append(target_class(**obj))
+                    objects.append(target_class.from_record(obj, omit))
                 except Exception as e:
                     logger.critical(f"Error creating object: {str(e)}")
 
@@ -60,7 +157,11 @@ class ObjectModel(BaseModel):
             raise DatabaseOperationError(e)
 
     @classmethod
-    def get(cls: Type[T], id: str) -> T:
+    def get(cls: Type[T], id: str, omit: Optional[Sequence[str]] = None) -> T:
+        """
+        Fetches a record by id. The class `lazy_fields` are left out unless `omit`
+        says otherwise, pass `omit=()` to read the whole record at once.
+        """
         if not id:
             raise InvalidInputError("ID cannot be empty")
         try:
@@ -77,9 +178,23 @@ class ObjectModel(BaseModel):
                     raise InvalidInputError(f"No class found for table {table_name}")
                 target_class = cast(Type[T], found_class)
 
-            result = repo_query(f"SELECT * FROM {id}")
+            if omit is None:
+                omit = target_class.lazy_fields
+
+            # Records read earlier in the same unit of work are served from memory,
+            # unless they were read without a field that is wanted now
+            identity_map = current_identity_map()
+            record = identity_map.get_record(id) if identity_map else None
+            if record is not None and all(
+                name in record or name in omit for name in target_class.lazy_fields
+            ):
+                return target_class.from_record(record, omit)
+
+            result = repo_query(target_class._select(id, omit))
             if result:
-                return target_class(**result[0])
+                if identity_map:
+                    identity_map.put_record(id, result[0])
+                return target_class.from_record(result[0], omit)
             else:
                 raise NotFoundError(f"{table_name} with id {id} not found")
         except Exception as e:
@@ -109,47 +224,60 @@ class ObjectModel(BaseModel):
     def get_embedding_content(self) -> Optional[str]:
         return None
 
-    def save(self) -> None:
-        from open_notebook.domain.models import model_manager
-
-        try:
-            self.model_validate(self.model_dump(), strict=True)
-            data = self._prepare_save_data()
-            data["updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            if self.needs_embedding():
-                embedding_content = self.get_embedding_content()
-                if embedding_content:
-                    EMBEDDING_MODEL = model_manager.embedding_model
-                    if not EMBEDDING_MODEL:
-                        logger.warning(
-                            "No embedding model found. Content will not be searchable."
-                        )
-                    data["embedding"] = (
-                        EMBEDDING_MODEL.embed([embedding_content])[0]
-                        if EMBEDDING_MODEL
-                        else []
+    def _build_save_data(self) -> Dict[str, Any]:
+        from open_notebook.domain.embedding import embed_text, get_embedding_model
+
+        self.model_validate(self.model_dump(), strict=True)
+        data = self._prepare_save_data()
+        data["updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        if self.needs_embedding():
+            embedding_content = self.get_embedding_content()
+            if embedding_content:
+                EMBEDDING_MODEL = get_embedding_model()
+                if EMBEDDING_MODEL:
+                    data["embedding"] = embed_text(embedding_content)
+                else:
+                    logger.warning(
+                        "No embedding model found. Content will not be searchable."
                     )
 
+        if self.id is None:
+            data["created"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            data["created"] = (
+                self.created.strftime("%Y-%m-%d %H:%M:%S")
+                if isinstance(self.created, datetime)
+                else self.created
+            )
+        return data
+
+    def _apply_save_result(self, repo_result) -> None:
+        # Update the current instance with the result, fields that were never loaded
+        # stay unloaded
+        unloaded = set(self.unloaded_fields())
+        for key, value in repo_result[0].items():
+            if key not in unloaded and hasattr(self, key):
+                if isinstance(getattr(self, key), BaseModel):
+                    setattr(self, key, type(getattr(self, key))(**value))
+                else:
+                    setattr(self, key, value)
+
+    def save(self) -> None:
+        try:
+            # Checked first, building the data may load some of them (see Note)
+            unloaded = self.unloaded_fields()
+            data = self._build_save_data()
             if self.id is None:
-                data["created"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 repo_result = repo_create(self.__class__.table_name, data)
+            elif unloaded:
+                # Replacing the content would drop the fields that were never loaded
+                repo_result = repo_merge(self.id, data)
             else:
-                data["created"] = (
-                    self.created.strftime("%Y-%m-%d %H:%M:%S")
-                    if isinstance(self.created, datetime)
-                    else self.created
-                )
                 logger.debug(f"Updating record with id {self.id}")
                 repo_result = repo_update(self.id, data)
-
-            # Update the current instance with the result
-            for key, value in repo_result[0].items():
-                if hasattr(self, key):
-                    if isinstance(getattr(self, key), BaseModel):
-                        setattr(self, key, type(getattr(self, key))(**value))
-                    else:
-                        setattr(self, key, value)
+            self._apply_save_result(repo_result)
+            invalidate([self.id], [self.__class__.table_name])
 
         except ValidationError as e:
             logger.error(f"Validation failed: {e}")
@@ -158,10 +286,27 @@ class ObjectModel(BaseModel):
             logger.error(f"Error saving record: {e}")
             raise
 
+    async def asave(self) -> None:
+        try:
+            unloaded = self.unloaded_fields()
+            # Embedding the content is a blocking provider call
+            data = await asyncio.to_thread(self._build_save_data)
+            if self.id is None:
+                repo_result = await arepo_create(self.__class__.table_name, data)
+            elif unloaded:
+                repo_result = await arepo_merge(self.id, data)
+            else:
+                logger.debug(f"Updating record with id {self.id}")
+                repo_result = await arepo_update(self.id, data)
+            self._apply_save_result(repo_result)
+            invalidate([self.id], [self.__class__.table_name])
+
+        except ValidationError as e:
+            logger.error(f"Validation failed: {e}")
+            raise
         except Exception as e:
-            logger.error(f"Error saving {self.__class__.table_name}: {str(e)}")
-            logger.exception(e)
-            raise DatabaseOperationError(e)
+            logger.error(f"Error saving record: {e}")
+            raise
 
     def _prepare_save_data(self) -> Dict[str, Any]:
         data = self.model_dump()
@@ -172,7 +317,9 @@ class ObjectModel(BaseModel):
             raise InvalidInputError("Cannot delete object without an ID")
         try:
             logger.debug(f"Deleting record with id {self.id}")
-            return repo_delete(self.id)
+            result = repo_delete(self.id)
+            invalidate([self.id], [self.__class__.table_name])
+            return result
         except Exception as e:
             logger.error(
                 f"Error deleting {self.__class__.table_name} with id {self.id}: {str(e)}"
@@ -187,9 +334,27 @@ class ObjectModel(BaseModel):
         if not relationship or not target_id or not self.id:
             raise InvalidInputError("Relationship and target ID must be provided")
         try:
-            return repo_relate(
+            result = repo_relate(
+                source=self.id, relationship=relationship, target=target_id, data=data
+            )
+            invalidate([self.id, target_id], [relationship])
+            return result
+        except Exception as e:
+            logger.error(f"Error creating relationship: {str(e)}")
+            logger.exception(e)
+            raise DatabaseOperationError(e)
+
+    async def arelate(
+        self, relationship: str, target_id: str, data: Optional[Dict] = {}
+    ) -> Any:
+        if not relationship or not target_id or not self.id:
+            raise InvalidInputError("Relationship and target ID must be provided")
+        try:
+            result = await arepo_relate(
                 source=self.id, relationship=relationship, target=target_id, data=data
             )
+            invalidate([self.id, target_id], [relationship])
+            return result
         except Exception as e:
             logger.error(f"Error creating relationship: {str(e)}")
             logger.exception(e)
@@ -209,6 +374,12 @@ class RecordModel(BaseModel):
         False  # Default to False, can be overridden in subclasses
     )
     _instances: ClassVar[Dict[str, "RecordModel"]] = {}  # Store instances by record_id
+    _listeners: ClassVar[Dict[str, List[Callable[["RecordModel"], None]]]] = {}
+    _refreshing: ClassVar[Set[str]] = set()
+    _refresh_lock: ClassVar[threading.Lock] = threading.Lock()
+    # Held while assigning, saving or reloading values, so that a background reload
+    # never overwrites an assignment that was not saved yet
+    _record_lock: ClassVar[threading.RLock] = threading.RLock()
 
     class Config:
         validate_assignment = True
@@ -225,6 +396,8 @@ class RecordModel(BaseModel):
             if kwargs:
                 for key, value in kwargs.items():
                     setattr(instance, key, value)
+            # Stale instances are still returned, the refresh runs in the background
+            instance._refresh_if_stale()
             return instance
 
         # If no instance exists, create a new one
@@ -253,6 +426,25 @@ class RecordModel(BaseModel):
 
             # Mark as initialized
             object.__setattr__(self, "_initialized", True)
+            object.__setattr__(self, "_loaded_at", time.monotonic())
+            object.__setattr__(self, "_stored", self._values())
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name.startswith("_"):
+            return super().__setattr__(name, value)
+        with RecordModel._record_lock:
+            # Counted first, auto_save classes save from within the assignment
+            edits = getattr(self, "_edits", 0)
+            object.__setattr__(self, "_edits", edits + 1)
+            try:
+                super().__setattr__(name, value)
+            except Exception:
+                object.__setattr__(self, "_edits", edits)
+                raise
+
+    def _dirty(self) -> bool:
+        """Whether values were assigned since the last update()"""
+        return getattr(self, "_edits", 0) != getattr(self, "_saved_edits", 0)
 
     @classmethod
     def get_instance(cls) -> "RecordModel":
@@ -265,26 +457,115 @@ class RecordModel(BaseModel):
             self.update()
         return self
 
-    def update(self):
+    def _values(self) -> Dict[str, Any]:
         # Get all non-ClassVar fields and their values
-        data = {
+        return {
             field_name: getattr(self, field_name)
             for field_name, field_info in self.model_fields.items()
             if not str(field_info.annotation).startswith("typing.ClassVar")
         }
 
+    def update(self):
+        with RecordModel._record_lock:
+            edits = getattr(self, "_edits", 0)
+            data = self._values()
+
         repo_upsert(self.record_id, data)
 
         result = repo_query(f"SELECT * FROM {self.record_id};")
-        if result:
-            for key, value in result[0].items():
-                if hasattr(self, key):
-                    object.__setattr__(
-                        self, key, value
-                    )  # Use object.__setattr__ to avoid triggering validation again
+        with RecordModel._record_lock:
+            object.__setattr__(self, "_saved_edits", edits)
+            # Values assigned while saving are kept for the next update
+            if result and not self._dirty():
+                self._apply_record(result[0])
+            changed = self._store_values()
+            object.__setattr__(self, "_loaded_at", time.monotonic())
+        if changed:
+            self._notify()
+
+        return self
 
+    def _apply_record(self, record: Dict[str, Any]) -> None:
+        """Copies the record values into the instance"""
+        for key, value in record.items():
+            if hasattr(self, key):
+                # Use object.__setattr__ to avoid triggering validation again
+                object.__setattr__(self, key, value)
+
+    def _store_values(self) -> bool:
+        """Records the values as saved, returns whether the saved values changed"""
+        stored = getattr(self, "_stored", None)
+        values = self._values()
+        object.__setattr__(self, "_stored", values)
+        # Not a change while the instance is being built
+        return stored is not None and values != stored
+
+    def reload(self) -> "RecordModel":
+        """
+        Reads the record again, unless the instance has unsaved values, and notifies
+        the listeners when it changed
+        """
+        result = repo_query(f"SELECT * FROM {self.record_id};")
+        changed = False
+        with RecordModel._record_lock:
+            if result and not self._dirty():
+                self._apply_record(result[0])
+                changed = self._store_values()
+            object.__setattr__(self, "_loaded_at", time.monotonic())
+        if changed:
+            self._notify()
         return self
 
+    def _refresh_if_stale(self) -> None:
+        if time.monotonic() - getattr(self, "_loaded_at", 0.0) < settings_ttl():
+            return
+        with RecordModel._refresh_lock:
+            if self.record_id in RecordModel._refreshing:
+                return
+            RecordModel._refreshing.add(self.record_id)
+        threading.Thread(
+            target=self._background_reload,
+            name=f"refresh-{self.record_id}",
+            daemon=True,
+        ).start()
+
+    def _background_reload(self) -> None:
+        try:
+            self.reload()
+        except Exception as e:
+            logger.warning(f"Error refreshing {self.record_id}: {e}")
+        finally:
+            with RecordModel._refresh_lock:
+                RecordModel._refreshing.discard(self.record_id)
+
+    def _notify(self) -> None:
+        for listener in list(RecordModel._listeners.get(self.record_id, [])):
+            try:
+                listener(self)
+            except Exception as e:
+                logger.error(f"Error notifying change of {self.record_id}: {e}")
+
+    @classmethod
+    def on_change(cls, listener: Callable[["RecordModel"], None]) -> None:
+        """
+        Calls `listener` with the instance whenever saving it or reloading it (on a
+        background refresh or a change made elsewhere) changes its values
+        """
+        RecordModel._listeners.setdefault(cls.record_id, []).append(listener)
+
+    @staticmethod
+    def reload_record(record_id: str) -> None:
+        """Reloads the instance of a record changed elsewhere, if there is one"""
+        instance = RecordModel._instances.get(record_id)
+        if instance is not None:
+            instance.reload()
+
+    @staticmethod
+    def expire_all() -> None:
+        """Makes every instance refresh on its next use"""
+        for instance in list(RecordModel._instances.values()):
+            object.__setattr__(instance, "_loaded_at", 0.0)
+
     @classmethod
     def clear_instance(cls):
         """Clear the singleton instance (useful for testing)"""
@@ -0,0 +1,338 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, cast
+
+from esperanto import EmbeddingModel
+from loguru import logger
+
+from open_notebook.config import CONFIG, EMBEDDING_CACHE_FILE
+from open_notebook.database.migrate import build_vector_indexes_in_background
+from open_notebook.domain.embedding_cache import (
+    EmbeddingCache,
+    QueryEmbeddingCache,
+    normalize_query,
+)
+from open_notebook.domain.models import model_manager
+from open_notebook.domain.vector_index import get_vector_index
+from open_notebook.exceptions import ConfigurationError, RateLimitError
+from open_notebook.utils import token_count_many
+
+DEFAULT_LIMITS: Dict[str, Any] = {
+    "max_batch_size": 64,
+    "max_batch_tokens": 8000,
+    "max_concurrency": 4,
+    "max_retries": 5,
+}
+
+
+def provider_limits(provider: str) -> Dict[str, Any]:
+    """
+    Batching and concurrency limits for an embedding provider.
+    Values come from the `embedding` section of open_notebook_config.yaml.
+    """
+    embedding_config = CONFIG.get("embedding") or {}
+    limits = dict(DEFAULT_LIMITS)
+    limits.update(embedding_config.get("default") or {})
+    limits.update((embedding_config.get("providers") or {}).get(provider) or {})
+    return limits
+
+
+def model_key(model: EmbeddingModel) -> str:
+    return f"{model.provider}/{model.name}"
+
+
+def get_embedding_model() -> Optional[EmbeddingModel]:
+    EMBEDDING_MODEL = model_manager.embedding_model
+    # Fallback for deprecated model name
+    if (
+        EMBEDDING_MODEL
+        and EMBEDDING_MODEL.provider == "gemini"
+        and EMBEDDING_MODEL.name == "embedding-gecko-001"
+    ):
+        EMBEDDING_MODEL = model_manager.get_model("embed-gecko-v1")
+    return EMBEDDING_MODEL
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    response = getattr(error, "response", None)
+    status_code = getattr(response, "status_code", None) or getattr(
+        error, "status_code", None
+    )
+    if status_code == 429:
+        return True
+    message = str(error).lower()
+    return any(
+        hint in message
+        for hint in ("429", "rate limit", "rate_limit", "resource exhausted", "quota")
+    )
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limiter that halves the allowed concurrency when the provider
+    rate limits us and slowly grows it back (by one) after a run of successes.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self._active = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._active >= self.limit:
+                self._condition.wait()
+            self._active += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    def record_success(self) -> None:
+        with self._condition:
+            self._successes += 1
+            if self.limit < self.max_concurrency and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def record_rate_limit(self) -> None:
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            logger.warning(
+                f"Embedding rate limited, concurrency lowered to {self.limit}"
+            )
+
+
+class BatchEmbedder:
+    """
+    Embeds many texts with as few provider calls as possible.
+
+    Texts are packed into batches bounded by the provider's max batch size and
+    token budget, and batches are sent concurrently under an adaptive, per-provider
+    concurrency limit. Results are returned in the same order as the input.
+    """
+
+    def __init__(self, cache: Optional[EmbeddingCache] = None):
+        self.cache = cache
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def _limiter(self, provider: str) -> AdaptiveLimiter:
+        with self._lock:
+            if provider not in self._limiters:
+                self._limiters[provider] = AdaptiveLimiter(
+                    provider_limits(provider)["max_concurrency"]
+                )
+            return self._limiters[provider]
+
+    @staticmethod
+    def make_batches(
+        texts: List[str], max_batch_size: int, max_batch_tokens: int
+    ) -> List[List[int]]:
+        """Groups text indexes into batches that respect the size and token limits"""
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for idx, tokens in enumerate(token_count_many(texts)):
+            if current and (
+                len(current) >= max_batch_size
+                or current_tokens + tokens > max_batch_tokens
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(idx)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(
+        self, model: EmbeddingModel, texts: List[str], max_retries: int
+    ) -> List[List[float]]:
+        limiter = self._limiter(model.provider)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            try:
+                embeddings = model.embed(texts)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                limiter.record_rate_limit()
+                attempt += 1
+                if attempt > max_retries:
+                    raise RateLimitError(
+                        f"Embedding provider {model.provider} kept rate limiting after {max_retries} retries"
+                    ) from e
+            else:
+                limiter.record_success()
+                return embeddings
+            finally:
+                limiter.release()
+            time.sleep(min(30.0, 2**attempt) + random.random())
+
+    def embed(
+        self, texts: List[str], model: Optional[EmbeddingModel] = None
+    ) -> List[List[float]]:
+        if not texts:
+            return []
+        model = model or get_embedding_model()
+        if not model:
+            raise ConfigurationError("No embedding model configured")
+        if self.cache is None:
+            return self._embed_uncached(texts, model)
+
+        key = model_key(model)
+        results = self.cache.get_many(key, texts)
+        missing = [idx for idx, vector in enumerate(results) if vector is None]
+        if missing:
+            # Identical texts are embedded once
+            unique_texts = list(dict.fromkeys(texts[idx] for idx in missing))
+            embeddings = self._embed_uncached(unique_texts, model)
+            self.cache.put_many(key, unique_texts, embeddings)
+            by_text = dict(zip(unique_texts, embeddings))
+            for idx in missing:
+                results[idx] = by_text[texts[idx]]
+        return cast(List[List[float]], results)
+
+    def _embed_uncached(
+        self, texts: List[str], model: EmbeddingModel
+    ) -> List[List[float]]:
+        limits = provider_limits(model.provider)
+        batches = self.make_batches(
+            texts, limits["max_batch_size"], limits["max_batch_tokens"]
+        )
+        if len(batches) > 1:
+            logger.debug(
+                f"Embedding {len(texts)} texts in {len(batches)} batches with {model.provider}"
+            )
+
+        def run(batch: List[int]) -> List[List[float]]:
+            return self._embed_batch(
+                model, [texts[idx] for idx in batch], limits["max_retries"]
+            )
+
+        if len(batches) == 1:
+            batch_results = [run(batches[0])]
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(len(batches), limits["max_concurrency"])
+            ) as executor:
+                batch_results = list(executor.map(run, batches))
+
+        results: List[List[float]] = [[] for _ in texts]
+        for batch, embeddings in zip(batches, batch_results):
+            for idx, embedding in zip(batch, embeddings):
+                results[idx] = embedding
+        return results
+
+
+def _build_cache() -> Optional[EmbeddingCache]:
+    cache_config = (CONFIG.get("embedding") or {}).get("cache") or {}
+    if not cache_config.get("enabled", True):
+        return None
+    return EmbeddingCache(
+        EMBEDDING_CACHE_FILE if cache_config.get("persistent", True) else None,
+        memory_items=cache_config.get("memory_items", 10_000),
+    )
+
+
+def _build_query_cache() -> Optional[QueryEmbeddingCache]:
+    cache_config = (CONFIG.get("embedding") or {}).get("query_cache") or {}
+    if not cache_config.get("enabled", True):
+        return None
+    return QueryEmbeddingCache(
+        max_items=cache_config.get("max_items", 1_000),
+        ttl=cache_config.get("ttl_seconds", 3_600),
+    )
+
+
+embedder = BatchEmbedder(cache=_build_cache())
+query_cache = _build_query_cache()
+
+
+def embedding_cache_stats() -> Dict[str, float]:
+    """Hit/miss counters of the embedding cache"""
+    return embedder.cache.stats() if embedder.cache else {}
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embeds texts with the default embedding model, batching provider calls"""
+    return embedder.embed(texts)
+
+
+def embed_text(text: str) -> List[float]:
+    return embedder.embed([text])[0]
+
+
+def query_cache_stats() -> Dict[str, float]:
+    """Hit/miss counters of the search query embedding cache"""
+    return query_cache.stats() if query_cache else {}
+
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """
+    Embeds search queries with the default embedding model in a single provider call.
+    Queries embedded recently (same model and normalized text) are served from cache.
+    """
+    if not queries:
+        return []
+    model = get_embedding_model()
+    if not model:
+        raise ConfigurationError("No embedding model configured")
+    normalized = [normalize_query(query) for query in queries]
+    if query_cache is None:
+        return embedder.embed(normalized, model)
+
+    key = model_key(model)
+    results = [query_cache.get(key, query) for query in normalized]
+    missing = list(
+        dict.fromkeys(
+            query for query, vector in zip(normalized, results) if vector is None
+        )
+    )
+    if missing:
+        by_query = dict(zip(missing, embedder.embed(missing, model)))
+        for query, vector in by_query.items():
+            query_cache.put(key, query, vector)
+        results = [
+            vector if vector is not None else by_query[query]
+            for query, vector in zip(normalized, results)
+        ]
+    return cast(List[List[float]], results)
+
+
+def embed_query(query: str) -> List[float]:
+    return embed_queries([query])[0]
+
+
+_index_build_started = False
+
+
+def build_vector_indexes() -> None:
+    """
+    Builds the HNSW indexes of fn::vector_search for the default embedding model
+    in the background, once per process. Called at app start and worker boot so
+    that searches never wait on it. Nothing to build with the numpy backend.
+    """
+    global _index_build_started
+    if _index_build_started or get_vector_index():
+        return
+    _index_build_started = True
+
+    def build() -> None:
+        try:
+            if get_embedding_model():
+                # The dimension comes from the model, the probe is cached after the first run
+                build_vector_indexes_in_background(len(embed_text("dimension")))
+        except Exception as e:
+            logger.warning(f"Could not build the vector indexes: {e}")
+
+    threading.Thread(target=build, name="vector-index-probe", daemon=True).start()
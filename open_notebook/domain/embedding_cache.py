@@ -0,0 +1,203 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+
+def text_hash(text: str) -> str:
+    """Hash of the normalized text, used as the content address of an embedding"""
+    normalized = unicodedata.normalize("NFC", text).strip()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def normalize_query(query: str) -> str:
+    """Collapses whitespace so trivially different search queries share an embedding"""
+    return " ".join(unicodedata.normalize("NFC", query).split())
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class EmbeddingCache:
+    """
+    Two tier, content addressed embedding cache.
+
+    Entries are keyed by (embedding model, hash of the normalized text). Lookups hit
+    an in-memory LRU first and fall back to a SQLite file shared by all processes.
+    The file is opened on first use by each process, never inherited across a fork.
+    """
+
+    def __init__(self, path: Optional[str], memory_items: int = 10_000):
+        self.path = path
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+
+    def _database(self) -> Optional[sqlite3.Connection]:
+        # Must be called with the lock held
+        if not self.path or self._db_pid == os.getpid():
+            return self._db
+        # First use in this process, a connection inherited from the parent is unsafe
+        self._db, self._db_pid = None, os.getpid()
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+                """
+            )
+            db.commit()
+            self._db = db
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache disabled on disk ({self.path}): {e}")
+        return self._db
+
+    def _remember(self, key: Tuple[str, str], vector: List[float]) -> None:
+        # Must be called with the lock held
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        hashes = [text_hash(text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        missing: Dict[str, List[int]] = {}
+        with self._lock:
+            for idx, h in enumerate(hashes):
+                key = (model, h)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[idx] = self._memory[key]
+                    self._stats.memory_hits += 1
+                else:
+                    missing.setdefault(h, []).append(idx)
+
+            db = self._database() if missing else None
+            if db is not None:
+                found = {}
+                keys = list(missing)
+                try:
+                    for start in range(0, len(keys), 500):
+                        batch = keys[start : start + 500]
+                        rows = db.execute(
+                            f"SELECT text_hash, vector FROM embedding_cache WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                            [model, *batch],
+                        ).fetchall()
+                        found.update(rows)
+                except sqlite3.Error as e:
+                    logger.warning(f"Error reading embedding cache: {e}")
+                for h, blob in found.items():
+                    vector = array("f", blob).tolist()
+                    self._remember((model, h), vector)
+                    for idx in missing.pop(h):
+                        results[idx] = vector
+                        self._stats.disk_hits += 1
+
+            self._stats.misses += sum(len(idxs) for idxs in missing.values())
+        return results
+
+    def put_many(
+        self, model: str, texts: Sequence[str], vectors: Sequence[List[float]]
+    ) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                if not vector:
+                    continue
+                h = text_hash(text)
+                self._remember((model, h), list(vector))
+                rows.append((model, h, array("f", vector).tobytes()))
+            db = self._database() if rows else None
+            if db is not None:
+                try:
+                    db.executemany(
+                        "INSERT OR REPLACE INTO embedding_cache (model, text_hash, vector) VALUES (?, ?, ?)",
+                        rows,
+                    )
+                    db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Error writing embedding cache: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            data = asdict(self._stats)
+            data["hit_rate"] = self._stats.hit_rate
+            data["memory_items"] = len(self._memory)
+        return data
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._memory.clear()
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU cache of search query embeddings whose entries expire after
+    `ttl` seconds. Keys are (embedding model, normalized query), case insensitive.
+    """
+
+    def __init__(self, max_items: int = 1_000, ttl: float = 3_600.0):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, List[float]]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, model: str, query: str) -> Optional[List[float]]:
+        key = (model, normalize_query(query).casefold())
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.memory_hits += 1
+            return entry[1]
+
+    def put(self, model: str, query: str, vector: List[float]) -> None:
+        key = (model, normalize_query(query).casefold())
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(
+                hits=self._stats.memory_hits,
+                misses=self._stats.misses,
+                hit_rate=self._stats.hit_rate,
+                items=len(self._entries),
+            )
@@ -0,0 +1,139 @@
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from loguru import logger
+
+
+class IdentityMap:
+    """
+    Read-through cache of database reads for one unit of work (a Streamlit run or a
+    graph invocation). Records are cached by id and query results by a key plus the
+    tables they read from, so that a write to a table drops every result built from it.
+
+    Writes made in a nested unit of work also invalidate the enclosing ones.
+    """
+
+    def __init__(self, parent: Optional["IdentityMap"] = None):
+        self.parent = parent
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._queries: Dict[Hashable, Tuple[Any, Set[str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with _registry_lock:
+            _active.add(self)
+
+    def get_record(self, id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(id)
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return record
+
+    def put_record(self, id: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._records[id] = record
+
+    def query(
+        self, key: Hashable, tables: Iterable[str], load: Callable[[], Any]
+    ) -> Any:
+        with self._lock:
+            if key in self._queries:
+                self.hits += 1
+                return self._queries[key][0]
+            self.misses += 1
+        # Loaded outside the lock, two threads may race to load the same key
+        result = load()
+        with self._lock:
+            self._queries[key] = (result, set(tables))
+        return result
+
+    def invalidate(self, ids: Iterable[str] = (), tables: Iterable[str] = ()) -> None:
+        ids = set(ids)
+        tables = set(tables) | {id.split(":")[0] for id in ids}
+        with self._lock:
+            for id in ids:
+                self._records.pop(id, None)
+            stale = [key for key, (_, deps) in self._queries.items() if deps & tables]
+            for key in stale:
+                del self._queries[key]
+        if self.parent:
+            self.parent.invalidate(ids, tables)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._queries.clear()
+
+
+# Every identity map still alive in this process, for invalidations coming from other
+# processes (see open_notebook.domain.live_invalidation)
+_active: "weakref.WeakSet[IdentityMap]" = weakref.WeakSet()
+_registry_lock = threading.Lock()
+
+_current: ContextVar[Optional[IdentityMap]] = ContextVar("identity_map", default=None)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    return _current.get()
+
+
+def begin_unit_of_work() -> Token:
+    """
+    Starts a new unit of work for the current context, replacing the previous one.
+    Used where there is no natural block to wrap, like the top of a Streamlit run.
+    """
+    return _current.set(IdentityMap())
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Caches database reads made inside the block. Nested units of work get their own
+    cache, and their writes also invalidate the outer one.
+    """
+    identity_map = IdentityMap(parent=_current.get())
+    token = _current.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _current.reset(token)
+        logger.debug(
+            f"Unit of work finished: {identity_map.hits} cache hits, {identity_map.misses} misses"
+        )
+
+
+def cached_query(key: Hashable, tables: Iterable[str], load: Callable[[], Any]) -> Any:
+    """Runs `load` once per unit of work for `key`, or every time outside of one"""
+    identity_map = _current.get()
+    if identity_map is None:
+        return load()
+    return identity_map.query(key, tables, load)
+
+
+def invalidate(ids: Iterable[str] = (), tables: Iterable[str] = ()) -> None:
+    """Drops cached records and query results affected by a write"""
+    identity_map = _current.get()
+    if identity_map is not None:
+        identity_map.invalidate(ids, tables)
+
+
+def invalidate_everywhere(ids: Iterable[str] = (), tables: Iterable[str] = ()) -> None:
+    """Drops affected entries from every live identity map of this process"""
+    ids, tables = list(ids), list(tables)
+    with _registry_lock:
+        identity_maps = list(_active)
+    for identity_map in identity_maps:
+        identity_map.invalidate(ids, tables)
+
+
+def clear_everywhere() -> None:
+    with _registry_lock:
+        identity_maps = list(_active)
+    for identity_map in identity_maps:
+        identity_map.clear()
@@ -0,0 +1,66 @@
+import threading
+from typing import Optional
+
+from loguru import logger
+
+from open_notebook.config import CONFIG
+from open_notebook.database.live import LiveInvalidationBus
+from open_notebook.domain.base import RecordModel
+from open_notebook.domain.identity_map import clear_everywhere, invalidate_everywhere
+from open_notebook.domain.models import model_manager
+
+DEFAULT_TABLES = [
+    "source",
+    "note",
+    "notebook",
+    "source_insight",
+    "model",
+    "open_notebook",
+    "reference",
+    "artifact",
+]
+
+_bus: Optional[LiveInvalidationBus] = None
+_lock = threading.Lock()
+
+
+def _reset_caches() -> None:
+    clear_everywhere()
+    RecordModel.expire_all()
+    model_manager.clear_cache()
+
+
+def on_change(table: Optional[str], record_id: Optional[str], action: str) -> None:
+    """Evicts what this process cached about a record changed by any process"""
+    if action == "RESET" or not table or not record_id:
+        _reset_caches()
+        return
+    logger.debug(f"Invalidating {record_id} ({action.lower()})")
+    invalidate_everywhere([record_id], [table])
+    if table == "open_notebook":
+        RecordModel.reload_record(record_id)
+    elif table == "model":
+        model_manager.evict(record_id)
+
+
+def start_live_invalidation() -> Optional[LiveInvalidationBus]:
+    """
+    Starts the invalidation bus for this process, once. Safe to call on every
+    Streamlit run or job start. Disabled with `live_invalidation.enabled: false`.
+    """
+    global _bus
+    config = CONFIG.get("live_invalidation") or {}
+    if not config.get("enabled", True):
+        return None
+    with _lock:
+        if _bus is None:
+            _bus = LiveInvalidationBus(config.get("tables") or DEFAULT_TABLES)
+            _bus.subscribe(on_change)
+        _bus.start()
+    return _bus
+
+
+def stop_live_invalidation() -> None:
+    with _lock:
+        if _bus is not None:
+            _bus.stop()
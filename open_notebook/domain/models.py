@@ -1,5 +1,9 @@
-from typing import ClassVar, Dict, Optional, Union
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, ClassVar, Dict, Optional, Tuple, Union
 
+import httpx
 from esperanto import (
     AIFactory,
     EmbeddingModel,
@@ -7,13 +11,20 @@ from esperanto import (
     SpeechToTextModel,
     TextToSpeechModel,
 )
+from loguru import logger
 
+from open_notebook.config import CONFIG
 from open_notebook.database.repository import repo_query
 from open_notebook.domain.base import ObjectModel, RecordModel
 
 ModelType = Union[LanguageModel, EmbeddingModel, SpeechToTextModel, TextToSpeechModel]
 
 
+def canonical_kwargs(kwargs: Dict[str, Any]) -> str:
+    """Same kwargs, same key, whatever their order"""
+    return json.dumps(kwargs, sort_keys=True, default=str)
+
+
 class Model(ObjectModel):
     table_name: ClassVar[str] = "model"
     name: str
@@ -51,26 +62,39 @@ class ModelManager:
     def __init__(self):
         if not hasattr(self, "_initialized"):
             self._initialized = True
-            self._model_cache: Dict[str, ModelType] = {}
+            models_config = CONFIG.get("models") or {}
+            self.max_cached_models = models_config.get("cache_size", 32)
+            self._model_cache: "OrderedDict[Tuple[str, str], ModelType]" = OrderedDict()
+            self._http_clients: Dict[Tuple[Any, ...], httpx.Client] = {}
+            self._lock = threading.RLock()
+            self._warmed_up = False
             self._default_models = None
+            DefaultModels.on_change(self._defaults_changed)
             self.refresh_defaults()
 
     def get_model(self, model_id: str, **kwargs) -> Optional[ModelType]:
         if not model_id:
             return None
 
-        cache_key = f"{model_id}:{str(kwargs)}"
-
-        if cache_key in self._model_cache:
-            cached_model = self._model_cache[cache_key]
-            if not isinstance(
-                cached_model,
-                (LanguageModel, EmbeddingModel, SpeechToTextModel, TextToSpeechModel),
-            ):
-                raise TypeError(
-                    f"Cached model is of unexpected type: {type(cached_model)}"
-                )
-            return cached_model
+        cache_key = (model_id, canonical_kwargs(kwargs))
+
+        with self._lock:
+            if cache_key in self._model_cache:
+                self._model_cache.move_to_end(cache_key)
+                cached_model = self._model_cache[cache_key]
+                if not isinstance(
+                    cached_model,
+                    (
+                        LanguageModel,
+                        EmbeddingModel,
+                        SpeechToTextModel,
+                        TextToSpeechModel,
+                    ),
+                ):
+                    raise TypeError(
+                        f"Cached model is of unexpected type: {type(cached_model)}"
+                    )
+                return cached_model
 
         model: Model = Model.get(model_id)
 
@@ -110,12 +134,82 @@ class ModelManager:
                 config=kwargs,
             )
 
-        self._model_cache[cache_key] = model_instance
+        self._share_http_client(model.provider, model_instance)
+        with self._lock:
+            # Built outside the lock, keep the first instance if two threads raced
+            model_instance = self._model_cache.setdefault(cache_key, model_instance)
+            self._model_cache.move_to_end(cache_key)
+            while len(self._model_cache) > self.max_cached_models:
+                self._model_cache.popitem(last=False)
         return model_instance
 
+    def _share_http_client(self, provider: str, model_instance: ModelType) -> None:
+        """
+        Points the model to the HTTP client already used by models of the same
+        provider and settings, so that they share one connection pool. Only the
+        sync client is shared, async clients are bound to the event loop they
+        first ran in.
+        """
+        client = getattr(model_instance, "client", None)
+        if not isinstance(client, httpx.Client):
+            return
+        key = (
+            provider,
+            str(client.base_url),
+            tuple(client.headers.raw),
+            repr(client.timeout),
+        )
+        with self._lock:
+            shared = self._http_clients.setdefault(key, client)
+        if shared is not client:
+            setattr(model_instance, "client", shared)
+            client.close()
+
+    def warm_up(self, background: bool = True) -> None:
+        """
+        Builds the default chat, transformation and embedding models ahead of the
+        first request, once per process. Disabled with `models.warm_up: false`.
+        """
+        if self._warmed_up or not (CONFIG.get("models") or {}).get("warm_up", True):
+            return
+        self._warmed_up = True
+        if background:
+            threading.Thread(
+                target=self._warm_up, name="model-warm-up", daemon=True
+            ).start()
+        else:
+            self._warm_up()
+
+    def _warm_up(self) -> None:
+        for model_type in ("chat", "transformation", "embedding"):
+            try:
+                model = self.get_default_model(model_type)
+                if isinstance(model, LanguageModel):
+                    # Also imports the LangChain integration of the provider
+                    model.to_langchain()
+            except Exception as e:
+                logger.warning(f"Could not warm up the default {model_type} model: {e}")
+
+    def _defaults_changed(self, defaults: RecordModel) -> None:
+        # Newly selected defaults are built before they are first used, like at start
+        if self._warmed_up:
+            threading.Thread(
+                target=self._warm_up, name="model-warm-up", daemon=True
+            ).start()
+
+    def evict(self, model_id: str):
+        """Drop cached instances of a model, for every kwargs combination"""
+        with self._lock:
+            for cache_key in list(self._model_cache):
+                if cache_key[0] == model_id:
+                    del self._model_cache[cache_key]
+
     def refresh_defaults(self):
         """Refresh the default models from the database"""
-        self._default_models = DefaultModels()
+        if self._default_models is None:
+            self._default_models = DefaultModels()
+        else:
+            self._default_models.reload()
 
     @property
     def defaults(self) -> DefaultModels:
@@ -124,6 +218,8 @@ class ModelManager:
             self.refresh_defaults()
             if not self._default_models:
                 raise RuntimeError("Failed to initialize default models configuration")
+        # Served from memory, refreshed in the background once the TTL expires
+        self._default_models._refresh_if_stale()
         return self._default_models
 
     @property
@@ -199,7 +295,8 @@ class ModelManager:
 
     def clear_cache(self):
         """Clear the model cache"""
-        self._model_cache.clear()
+        with self._lock:
+            self._model_cache.clear()
 
 
 model_manager = ModelManager()
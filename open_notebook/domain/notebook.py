@@ -374,17 +374,39 @@
 #         raise DatabaseOperationError(e)
 
 
+import asyncio
+import itertools
 from concurrent.futures import ThreadPoolExecutor
-from typing import Any, ClassVar, Dict, List, Literal, Optional, Tuple
+from datetime import datetime
+from typing import Any, ClassVar, Dict, List, Literal, Optional, Sequence, Tuple
 
 from loguru import logger
 from pydantic import BaseModel, Field, field_validator
 
-from open_notebook.database.repository import repo_query
+from open_notebook.config import CONFIG
+from open_notebook.database.migrate import (
+    VECTOR_SEARCH_MAX_RESULTS,
+    build_vector_indexes_in_background,
+    vector_indexes_ready,
+)
+from open_notebook.database.repository import (
+    arepo_insert_many,
+    arepo_merge,
+    arepo_query,
+    repo_insert_many,
+    repo_query,
+)
 from open_notebook.domain.base import ObjectModel
-from open_notebook.domain.models import model_manager
+from open_notebook.domain.embedding import (
+    embed_query,
+    embed_texts,
+    get_embedding_model,
+)
+from open_notebook.domain.embedding_cache import text_hash
+from open_notebook.domain.identity_map import cached_query, invalidate
+from open_notebook.domain.vector_index import VectorEntry, VectorIndex, get_vector_index
 from open_notebook.exceptions import DatabaseOperationError, InvalidInputError
-from open_notebook.utils import split_text, surreal_clean
+from open_notebook.utils import chunk_text, surreal_clean
 
 import os
 import google.generativeai as genai
@@ -408,16 +430,67 @@ class Notebook(ObjectModel):
 
     @property
     def sources(self) -> List["Source"]:
+        return self.get_sources()
+
+    def get_sources(self, omit: Optional[Sequence[str]] = None) -> List["Source"]:
+        """
+        The notebook sources, most recently updated first. Like get_all(), the Source
+        lazy_fields are left out unless `omit` says otherwise, pass `omit=()` to read
+        them in the same query instead of one query per source.
+        """
+        if omit is None:
+            omit = Source.lazy_fields
+        projection = "*"
+        if omit:
+            projection += f" omit {', '.join(f'source.{name}' for name in omit)}"
         try:
-            srcs = repo_query(
-                f"""
-                select * omit source.full_text from (
-                select in as source from reference where out={self.id}
-                fetch source
-            ) order by source.updated desc
-                """
+            srcs = cached_query(
+                ("notebook_sources", self.id, tuple(omit)),
+                ("source", "reference"),
+                lambda: repo_query(
+                    f"""
+                    select {projection} from (
+                    select in as source from reference where out={self.id}
+                    fetch source
+                ) order by source.updated desc
+                    """
+                ),
+            )
+            return (
+                [Source.from_record(src["source"], omit) for src in srcs]
+                if srcs
+                else []
+            )
+        except Exception as e:
+            logger.error(f"Error fetching sources for notebook {self.id}: {e}")
+            raise DatabaseOperationError(e)
+
+    @property
+    def source_summaries(self) -> List["SourceSummary"]:
+        """
+        The notebook sources with their insight and chunk counts, in a single query.
+        Used by listings that would otherwise query each source's insights.
+        """
+        try:
+            srcs = cached_query(
+                ("notebook_source_summaries", self.id),
+                ("source", "reference", "source_insight", "source_embedding"),
+                lambda: repo_query(
+                    f"""
+                    select
+                        in.id as id,
+                        in.title as title,
+                        in.topics as topics,
+                        in.created as created,
+                        in.updated as updated,
+                        count((select id from source_insight where source=$parent.in)) as insights_count,
+                        count((select id from source_embedding where source=$parent.in)) as chunks_count
+                    from reference where out={self.id}
+                    order by updated desc
+                    """
+                ),
             )
-            return [Source(**src["source"]) for src in srcs] if srcs else []
+            return [SourceSummary(**src) for src in srcs] if srcs else []
         except Exception as e:
             logger.error(f"Error fetching sources for notebook {self.id}: {e}")
             raise DatabaseOperationError(e)
@@ -425,15 +498,23 @@ class Notebook(ObjectModel):
     @property
     def notes(self) -> List["Note"]:
         try:
-            srcs = repo_query(
-                f"""
-                select * omit note.content, note.embedding from (
-                    select in as note from artifact where out={self.id}
-                    fetch note
-                ) order by note.updated desc
-                """
+            srcs = cached_query(
+                ("notebook_notes", self.id),
+                ("note", "artifact"),
+                lambda: repo_query(
+                    f"""
+                    select * omit note.content, note.embedding from (
+                        select in as note from artifact where out={self.id}
+                        fetch note
+                    ) order by note.updated desc
+                    """
+                ),
+            )
+            return (
+                [Note.from_record(src["note"], Note.lazy_fields) for src in srcs]
+                if srcs
+                else []
             )
-            return [Note(**src["note"]) for src in srcs] if srcs else []
         except Exception as e:
             logger.error(f"Error fetching notes for notebook {self.id}: {e}")
             raise DatabaseOperationError(e)
@@ -441,17 +522,21 @@ class Notebook(ObjectModel):
     @property
     def chat_sessions(self) -> List["ChatSession"]:
         try:
-            srcs = repo_query(
-                f"""
-                select * from (
-                    select
-                    <- chat_session as chat_session
-                    from refers_to
-                    where out={self.id}
-                    fetch chat_session
-                )
-                order by chat_session.updated desc
-                """
+            srcs = cached_query(
+                ("notebook_chat_sessions", self.id),
+                ("chat_session", "refers_to"),
+                lambda: repo_query(
+                    f"""
+                    select * from (
+                        select
+                        <- chat_session as chat_session
+                        from refers_to
+                        where out={self.id}
+                        fetch chat_session
+                    )
+                    order by chat_session.updated desc
+                    """
+                ),
             )
             return [ChatSession(**src["chat_session"][0]) for src in srcs] if srcs else []
         except Exception as e:
@@ -466,17 +551,24 @@ class Asset(BaseModel):
 
 class SourceEmbedding(ObjectModel):
     table_name: ClassVar[str] = "source_embedding"
+    lazy_fields: ClassVar[Tuple[str, ...]] = ("embedding",)
     content: str
 
     @property
     def source(self) -> "Source":
         try:
-            src = repo_query(
-                f"""
-                select source.* from {self.id} fetch source
-                """
+            src = cached_query(
+                ("source_embedding_source", self.id),
+                ("source",),
+                lambda: repo_query(
+                    f"""
+                    select * omit source.full_text from (
+                        select source from {self.id} fetch source
+                    )
+                    """
+                ),
             )
-            return Source(**src[0]["source"])
+            return Source.from_record(src[0]["source"], ("full_text",))
         except Exception as e:
             logger.error(f"Error fetching source for embedding {self.id}: {e}")
             raise DatabaseOperationError(e)
@@ -484,22 +576,36 @@ class SourceEmbedding(ObjectModel):
 
 class SourceInsight(ObjectModel):
     table_name: ClassVar[str] = "source_insight"
+    lazy_fields: ClassVar[Tuple[str, ...]] = ("embedding",)
     insight_type: str
     content: str
 
     @property
     def source(self) -> "Source":
         try:
-            src = repo_query(
-                f"""
-                select source.* from {self.id} fetch source
-                """
+            src = cached_query(
+                ("source_insight_source", self.id),
+                ("source",),
+                lambda: repo_query(
+                    f"""
+                    select * omit source.full_text from (
+                        select source from {self.id} fetch source
+                    )
+                    """
+                ),
             )
-            return Source(**src[0]["source"])
+            return Source.from_record(src[0]["source"], ("full_text",))
         except Exception as e:
             logger.error(f"Error fetching source for insight {self.id}: {e}")
             raise DatabaseOperationError(e)
 
+    def delete(self) -> bool:
+        result = super().delete()
+        index = get_vector_index()
+        if index:
+            index.remove([self.id])
+        return result
+
     def save_as_note(self, notebook_id: str = None) -> Any:
         note = Note(
             title=f"{self.insight_type} from source {self.source.title}",
@@ -511,12 +617,46 @@ class SourceInsight(ObjectModel):
         return note
 
 
+class SourceSummary(BaseModel):
+    """Read-only projection of a source used by the notebook listings"""
+
+    id: str
+    title: Optional[str] = None
+    topics: Optional[List[str]] = Field(default_factory=list)
+    created: Optional[datetime] = None
+    updated: Optional[datetime] = None
+    insights_count: int = 0
+    chunks_count: int = 0
+
+
 class Source(ObjectModel):
     table_name: ClassVar[str] = "source"
+    # Often megabytes, loaded on first access
+    lazy_fields: ClassVar[Tuple[str, ...]] = ("full_text",)
     asset: Optional[Asset] = None
     title: Optional[str] = None
     topics: Optional[List[str]] = Field(default_factory=list)
     full_text: Optional[str] = None
+    # Hash of the content it was ingested from, see content_fingerprint
+    fingerprint: Optional[str] = None
+
+    @classmethod
+    async def afind_by_fingerprint(cls, fingerprint: str) -> Optional["Source"]:
+        """The source already ingested from the same content, if any"""
+        result = await arepo_query(
+            f"{cls._select('source', cls.lazy_fields)} WHERE fingerprint = $fingerprint LIMIT 1",
+            {"fingerprint": fingerprint},
+        )
+        return cls.from_record(result[0], cls.lazy_fields) if result else None
+
+    async def aset_fingerprint(self, fingerprint: str) -> None:
+        """
+        Set once the source is fully ingested, so that only complete sources are
+        reused. Fails if another source has the same fingerprint.
+        """
+        await arepo_merge(self.id, {"fingerprint": fingerprint})
+        self.fingerprint = fingerprint
+        invalidate([self.id], ["source"])
 
     def get_context(
         self, context_size: Literal["short", "long"] = "short"
@@ -535,10 +675,14 @@ class Source(ObjectModel):
     @property
     def embedded_chunks(self) -> int:
         try:
-            result = repo_query(
-                f"""
-                select count() as chunks from source_embedding where source={self.id} GROUP ALL
-                """
+            result = cached_query(
+                ("source_embedded_chunks", self.id),
+                ("source_embedding",),
+                lambda: repo_query(
+                    f"""
+                    select count() as chunks from source_embedding where source={self.id} GROUP ALL
+                    """
+                ),
             )
             return result[0]["chunks"] if result else 0
         except Exception as e:
@@ -548,88 +692,323 @@ class Source(ObjectModel):
     @property
     def insights(self) -> List[SourceInsight]:
         try:
-            result = repo_query(
-                f"""
-                SELECT * FROM source_insight WHERE source={self.id}
-                """
+            result = cached_query(
+                ("source_insights", self.id),
+                ("source_insight",),
+                lambda: repo_query(
+                    f"""
+                    SELECT * OMIT embedding FROM source_insight WHERE source={self.id}
+                    """
+                ),
             )
             return [SourceInsight(**insight) for insight in result]
         except Exception as e:
             logger.error(f"Error fetching insights for source {self.id}: {e}")
             raise DatabaseOperationError(e)
 
+    def _apply_save_result(self, repo_result) -> None:
+        super()._apply_save_result(repo_result)
+        index = get_vector_index()
+        if index:
+            index.retitle(self.id, self.title)
+
+    def delete(self) -> bool:
+        result = super().delete()
+        # Chunks and insights are removed by the source_delete database event
+        invalidate([self.id], ["source_insight", "source_embedding", "reference"])
+        index = get_vector_index()
+        if index:
+            index.remove_parent(self.id)
+        return result
+
     def add_to_notebook(self, notebook_id: str) -> Any:
         if not notebook_id:
             raise InvalidInputError("Notebook ID must be provided")
         return self.relate("reference", notebook_id)
 
+    def _stored_chunks(self) -> List[Dict[str, Any]]:
+        return repo_query(
+            f"""
+            SELECT id, order, content_hash, embedding = NONE AS unembedded
+            FROM source_embedding WHERE source={self.id}
+            """
+        )
+
     def vectorize(self) -> None:
+        """Blocking version of avectorize, for callers outside of an event loop"""
+        asyncio.run(self.avectorize())
+
+    async def avectorize(
+        self, batch_size: Optional[int] = None, max_pending: Optional[int] = None
+    ) -> None:
+        """
+        Embeds the source text for vector search.
+        Chunks that are already stored (same content hash) are kept, only new chunks
+        are embedded and chunks that no longer exist in the text are deleted.
+
+        Chunking, embedding and inserting run as a pipeline over batches of
+        `batch_size` chunks, with at most `max_pending` batches waiting between
+        stages. Memory stays bounded whatever the size of the text, and chunks are
+        searchable as soon as their batch is written.
+        """
         logger.info(f"Starting vectorization for source {self.id}")
-        EMBEDDING_MODEL = model_manager.embedding_model
-        # Fallback for deprecated model name
-        if EMBEDDING_MODEL and EMBEDDING_MODEL.provider == "gemini" and EMBEDDING_MODEL.name == "embedding-gecko-001":
-            EMBEDDING_MODEL = model_manager.get_model("embed-gecko-v1")
+        ingest_config = (CONFIG.get("embedding") or {}).get("ingest") or {}
+        batch_size = batch_size or ingest_config.get("batch_size", 64)
+        max_pending = max_pending or ingest_config.get("max_pending", 4)
 
         try:
+            await self.aload_lazy_fields()
             if not self.full_text:
                 logger.warning(f"No text to vectorize for source {self.id}")
                 return
 
-            chunks = split_text(self.full_text)
-            logger.info(f"Split into {len(chunks)} chunks for source {self.id}")
+            stored: Dict[str, List[Dict[str, Any]]] = {}
+            for row in await asyncio.to_thread(self._stored_chunks):
+                # Chunks stored before hashes existed, or without an embedding, can't
+                # be matched and get replaced
+                key = "" if row.get("unembedded") else row.get("content_hash") or ""
+                stored.setdefault(key, []).append(row)
+
+            to_embed: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+            to_write: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+            reordered: List[Tuple[str, int]] = []
+            counts = dict(chunks=0, new=0)
+
+            async def chunk_stage() -> None:
+                chunks = enumerate(chunk_text(self.full_text or ""))
+                while True:
+                    # Tokenizing is CPU bound, keep it off the event loop
+                    batch = await asyncio.to_thread(
+                        lambda: list(itertools.islice(chunks, batch_size))
+                    )
+                    if not batch:
+                        break
+                    counts["chunks"] += len(batch)
+                    new_chunks: List[Tuple[int, str, str]] = []
+                    for idx, chunk in batch:
+                        chunk_hash = text_hash(chunk)
+                        if stored.get(chunk_hash):
+                            row = stored[chunk_hash].pop()
+                            if row.get("order") != idx:
+                                reordered.append((row["id"], idx))
+                        else:
+                            new_chunks.append((idx, chunk, chunk_hash))
+                    if new_chunks:
+                        await to_embed.put(new_chunks)
+                await to_embed.put(None)
+
+            async def embed_stage() -> None:
+                while (new_chunks := await to_embed.get()) is not None:
+                    embeddings = await asyncio.to_thread(
+                        embed_texts, [chunk for _, chunk, _ in new_chunks]
+                    )
+                    await to_write.put((new_chunks, embeddings))
+                await to_write.put(None)
+
+            async def write_stage() -> None:
+                while (item := await to_write.get()) is not None:
+                    new_chunks, embeddings = item
+                    await self._awrite_chunks(new_chunks, embeddings)
+                    counts["new"] += len(new_chunks)
+
+            async with asyncio.TaskGroup() as pipeline:
+                pipeline.create_task(chunk_stage())
+                pipeline.create_task(embed_stage())
+                pipeline.create_task(write_stage())
+
+            stale = [row["id"] for rows in stored.values() for row in rows]
+            logger.info(
+                f"Source {self.id}: {counts['chunks']} chunks, {counts['new']} new, {len(stale)} stale, {len(reordered)} reordered"
+            )
+            for start in range(0, len(stale), 500):
+                await arepo_query(f"DELETE {', '.join(stale[start : start + 500])};")
+            for start in range(0, len(reordered), 500):
+                updates = "".join(
+                    f"UPDATE {id} SET order = {order};"
+                    for id, order in reordered[start : start + 500]
+                )
+                await arepo_query(f"BEGIN TRANSACTION; {updates} COMMIT TRANSACTION;")
+            invalidate([self.id], ["source_embedding"])
+            index = get_vector_index()
+            if index:
+                index.remove(stale)
+            logger.info(f"Vectorization complete for source {self.id}")
 
-            def process_chunk(idx_chunk: Tuple[int, str]) -> Tuple[int, List[float], str]:
-                idx, chunk = idx_chunk
-                try:
-                    embedding = EMBEDDING_MODEL.embed([chunk])[0]
-                    return idx, embedding, surreal_clean(chunk)
-                except Exception as e:
-                    logger.error(f"Error processing chunk {idx}: {e}")
-                    raise
+        except Exception as e:
+            if isinstance(e, ExceptionGroup):
+                e = e.exceptions[0]
+            logger.error(f"Error vectorizing source {self.id}: {e}")
+            raise DatabaseOperationError(e)
 
-            with ThreadPoolExecutor(max_workers=8) as executor:
-                results = list(executor.map(process_chunk, enumerate(chunks)))
+    async def _awrite_chunks(
+        self, new_chunks: List[Tuple[int, str, str]], embeddings: List[List[float]]
+    ) -> None:
+        await arepo_insert_many(
+            "source_embedding",
+            [
+                {
+                    "source": self.id,
+                    "order": idx,
+                    "content": surreal_clean(chunk),
+                    "content_hash": chunk_hash,
+                    "embedding": embedding,
+                }
+                for (idx, chunk, chunk_hash), embedding in zip(new_chunks, embeddings)
+            ],
+            record_fields=("source",),
+        )
+        invalidate([self.id], ["source_embedding"])
+        index = get_vector_index()
+        if not index:
+            return
+        # Inserted rows are matched back to their vectors through the content hash
+        by_hash = {
+            chunk_hash: (chunk, embedding)
+            for (_, chunk, chunk_hash), embedding in zip(new_chunks, embeddings)
+        }
+        rows = await arepo_query(
+            f"""
+            SELECT id, content_hash FROM source_embedding
+            WHERE source={self.id} AND content_hash IN $hashes
+            """,
+            {"hashes": list(by_hash)},
+        )
+        index.upsert(
+            [
+                VectorEntry(
+                    id=row["id"],
+                    kind="source_embedding",
+                    parent_id=self.id,
+                    title=self.title,
+                    content=surreal_clean(by_hash[row["content_hash"]][0]),
+                    embedding=by_hash[row["content_hash"]][1],
+                )
+                for row in rows
+                if row.get("content_hash") in by_hash
+            ]
+        )
 
-            for idx, embedding, content in results:
-                repo_query(
-                    f"""
-                    CREATE source_embedding CONTENT {{
-                        "source": {self.id},
-                        "order": {idx},
-                        "content": $content,
-                        "embedding": {embedding},
-                    }};""",
-                    {"content": content},
+    async def aadd_to_notebook(self, notebook_id: str) -> Any:
+        if not notebook_id:
+            raise InvalidInputError("Notebook ID must be provided")
+        return await self.arelate("reference", notebook_id)
+
+    async def ain_notebook(self, notebook_id: str) -> bool:
+        result = await arepo_query(
+            f"SELECT VALUE id FROM reference WHERE in = {self.id} AND out = {notebook_id} LIMIT 1"
+        )
+        return bool(result)
+
+    def _insight_rows(
+        self, insights: Sequence[Tuple[str, str]]
+    ) -> List[Dict[str, Any]]:
+        rows: List[Dict[str, Any]] = [
+            {
+                "source": self.id,
+                "insight_type": insight_type,
+                "content": surreal_clean(content),
+            }
+            for insight_type, content in insights
+        ]
+        if get_embedding_model():
+            # All of them in one embedding call
+            embeddings = embed_texts([content for _, content in insights])
+            for row, embedding in zip(rows, embeddings):
+                row["embedding"] = embedding
+        else:
+            logger.warning("No embedding model found. Insights will not be searchable.")
+        return rows
+
+    def _inserted_insights_query(
+        self, rows: List[Dict[str, Any]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        return (
+            f"""
+            SELECT id, insight_type, content FROM source_insight
+            WHERE source={self.id} AND content IN $contents
+            """,
+            {"contents": [row["content"] for row in rows]},
+        )
+
+    def _index_insights(
+        self,
+        index: VectorIndex,
+        rows: List[Dict[str, Any]],
+        inserted: List[Dict[str, Any]],
+    ) -> None:
+        # Inserted rows are matched back to their vectors through type and content
+        by_key = {
+            (row["insight_type"], row["content"]): row["embedding"]
+            for row in rows
+            if row.get("embedding")
+        }
+        index.upsert(
+            [
+                VectorEntry(
+                    id=record["id"],
+                    kind="source_insight",
+                    parent_id=self.id,
+                    title=self.title,
+                    content=record["content"],
+                    embedding=by_key[key],
+                    insight_type=record["insight_type"],
                 )
-            logger.info(f"Vectorization complete for source {self.id}")
+                for record in inserted
+                if (key := (record["insight_type"], record["content"])) in by_key
+            ]
+        )
 
+    def add_insights(self, insights: Sequence[Tuple[str, str]]) -> None:
+        """Stores (insight type, content) pairs with one embedding call and one insert"""
+        if not insights:
+            return
+        try:
+            rows = self._insight_rows(insights)
+            repo_insert_many(
+                "source_insight",
+                rows,
+                batch_size=len(rows),
+                record_fields=("source",),
+            )
+            invalidate([self.id], ["source_insight"])
+            index = get_vector_index()
+            if index:
+                inserted = repo_query(*self._inserted_insights_query(rows))
+                self._index_insights(index, rows, inserted)
         except Exception as e:
-            logger.error(f"Error vectorizing source {self.id}: {e}")
+            logger.error(f"Error adding insights to source {self.id}: {e}")
             raise DatabaseOperationError(e)
 
-    def add_insight(self, insight_type: str, content: str) -> Any:
-        EMBEDDING_MODEL = model_manager.embedding_model
-        if not EMBEDDING_MODEL:
-            logger.warning("No embedding model found. Insight will not be searchable.")
+    async def aadd_insights(self, insights: Sequence[Tuple[str, str]]) -> None:
+        if not insights:
+            return
         try:
-            embedding = EMBEDDING_MODEL.embed([content])[0] if EMBEDDING_MODEL else []
-            return repo_query(
-                f"""
-                CREATE source_insight CONTENT {{
-                    "source": {self.id},
-                    "insight_type": '{insight_type}',
-                    "content": $content,
-                    "embedding": {embedding},
-                }};""",
-                {"content": surreal_clean(content)},
+            rows = await asyncio.to_thread(self._insight_rows, insights)
+            await arepo_insert_many(
+                "source_insight",
+                rows,
+                batch_size=len(rows),
+                record_fields=("source",),
             )
+            invalidate([self.id], ["source_insight"])
+            index = get_vector_index()
+            if index:
+                inserted = await arepo_query(*self._inserted_insights_query(rows))
+                await asyncio.to_thread(self._index_insights, index, rows, inserted)
         except Exception as e:
-            logger.error(f"Error adding insight to source {self.id}: {e}")
+            logger.error(f"Error adding insights to source {self.id}: {e}")
             raise DatabaseOperationError(e)
 
+    def add_insight(self, insight_type: str, content: str) -> None:
+        self.add_insights([(insight_type, content)])
+
+    async def aadd_insight(self, insight_type: str, content: str) -> None:
+        await self.aadd_insights([(insight_type, content)])
+
 
 class Note(ObjectModel):
     table_name: ClassVar[str] = "note"
+    lazy_fields: ClassVar[Tuple[str, ...]] = ("content", "embedding")
     title: Optional[str] = None
     note_type: Optional[Literal["human", "ai"]] = None
     content: Optional[str] = None
@@ -664,6 +1043,34 @@ class Note(ObjectModel):
     def get_embedding_content(self) -> Optional[str]:
         return self.content
 
+    def _apply_save_result(self, repo_result) -> None:
+        super()._apply_save_result(repo_result)
+        index = get_vector_index()
+        if index:
+            embedding = repo_result[0].get("embedding")
+            if embedding:
+                index.upsert(
+                    [
+                        VectorEntry(
+                            id=self.id,
+                            kind="note",
+                            parent_id=self.id,
+                            title=self.title,
+                            content=self.content,
+                            embedding=embedding,
+                        )
+                    ]
+                )
+            else:
+                index.remove([self.id])
+
+    def delete(self) -> bool:
+        result = super().delete()
+        index = get_vector_index()
+        if index:
+            index.remove([self.id])
+        return result
+
 
 class ChatSession(ObjectModel):
     table_name: ClassVar[str] = "chat_session"
@@ -675,51 +1082,328 @@ class ChatSession(ObjectModel):
         return self.relate("refers_to", notebook_id)
 
 
-def text_search(keyword: str, results: int, source: bool = True, note: bool = True):
+def _text_search_query(
+    keyword: str,
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    notebook_id: Optional[str] = None,
+) -> Tuple[str, dict]:
+    vars = {"keyword": keyword, "results": results, "source": source, "note": note}
+    if notebook_id:
+        return (
+            f"""
+            select *
+            from fn::text_search_notebook({notebook_id}, $keyword, $results, $source, $note)
+            """,
+            vars,
+        )
+    return (
+        """
+            select *
+            from fn::text_search($keyword, $results, $source, $note)
+            """,
+        vars,
+    )
+
+
+def text_search(
+    keyword: str,
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    notebook_id: Optional[str] = None,
+):
+    """
+    Full text (BM25) search. With `notebook_id`, only the sources and notes of that
+    notebook are searched.
+    """
     if not keyword:
         raise InvalidInputError("Search keyword cannot be empty")
     try:
         return repo_query(
-            """
-            select *
-            from fn::text_search($keyword, $results, $source, $note)
-            """,
-            {"keyword": keyword, "results": results, "source": source, "note": note},
+            *_text_search_query(keyword, results, source, note, notebook_id)
         )
     except Exception as e:
         logger.error(f"Error performing text search: {e}")
         raise DatabaseOperationError(e)
 
 
-def vector_search(
+async def atext_search(
     keyword: str,
     results: int,
     source: bool = True,
     note: bool = True,
-    minimum_score: float = 0.2,
+    notebook_id: Optional[str] = None,
 ):
     if not keyword:
         raise InvalidInputError("Search keyword cannot be empty")
     try:
-        EMBEDDING_MODEL = model_manager.embedding_model
-        # fallback for deprecated model
-        if EMBEDDING_MODEL and EMBEDDING_MODEL.provider == "gemini" and EMBEDDING_MODEL.name == "embedding-gecko-001":
-            EMBEDDING_MODEL = model_manager.get_model("embed-gecko-v1")
+        return await arepo_query(
+            *_text_search_query(keyword, results, source, note, notebook_id)
+        )
+    except Exception as e:
+        logger.error(f"Error performing text search: {e}")
+        raise DatabaseOperationError(e)
 
-        embed = EMBEDDING_MODEL.embed([keyword])[0]
-        return repo_query(
+
+def _vector_search_query(
+    embed: List[float],
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    minimum_score: float = 0.2,
+    notebook_id: Optional[str] = None,
+) -> Tuple[str, dict]:
+    vars = {
+        "embed": embed,
+        "results": results,
+        "source": source,
+        "note": note,
+        "minimum_score": minimum_score,
+    }
+    if notebook_id:
+        return (
+            f"""
+            SELECT * FROM fn::vector_search_notebook({notebook_id}, $embed, $results, $source, $note, $minimum_score)
+            """,
+            vars,
+        )
+    if results <= VECTOR_SEARCH_MAX_RESULTS and vector_indexes_ready(len(embed)):
+        return (
             """
             SELECT * FROM fn::vector_search($embed, $results, $source, $note, $minimum_score)
             """,
-            {
-                "embed": embed,
-                "results": results,
-                "source": source,
-                "note": note,
-                "minimum_score": minimum_score,
-            },
+            vars,
+        )
+    # Without its HNSW indexes (first searches, new embedding model) or for more
+    # results than they return, search exhaustively
+    build_vector_indexes_in_background(len(embed))
+    return (
+        """
+            SELECT * FROM fn::vector_search_exact($embed, $results, $source, $note, $minimum_score)
+            """,
+        vars,
+    )
+
+
+def _notebook_member_ids(notebook_id: str) -> List[str]:
+    """Ids of the sources and notes that belong to a notebook"""
+    result = repo_query(
+        f"""
+        RETURN array::union(
+            (SELECT VALUE in FROM reference WHERE out = {notebook_id}),
+            (SELECT VALUE in FROM artifact WHERE out = {notebook_id})
+        );
+        """
+    )
+    return result or []
+
+
+def _index_vector_search(
+    index: VectorIndex,
+    embed: List[float],
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    minimum_score: float = 0.2,
+    notebook_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    parent_ids = _notebook_member_ids(notebook_id) if notebook_id else None
+    return index.search(embed, results, source, note, minimum_score, parent_ids)
+
+
+def vector_search(
+    keyword: str,
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    minimum_score: float = 0.2,
+    embedding: Optional[List[float]] = None,
+    notebook_id: Optional[str] = None,
+):
+    """
+    Semantic search over sources, insights and notes.
+    Pass `embedding` when the keyword was already embedded (see embed_queries) and
+    `notebook_id` to only search the sources and notes of that notebook.
+    """
+    if not keyword:
+        raise InvalidInputError("Search keyword cannot be empty")
+    try:
+        embed = embedding or embed_query(keyword)
+        index = get_vector_index()
+        # Until a worker builds the index (see VectorIndex.maintain) search the database
+        if index and index.synced:
+            return _index_vector_search(
+                index, embed, results, source, note, minimum_score, notebook_id
+            )
+        return repo_query(
+            *_vector_search_query(
+                embed, results, source, note, minimum_score, notebook_id
+            )
         )
     except Exception as e:
         logger.error(f"Error performing vector search: {e}")
         raise DatabaseOperationError(e)
 
+
+async def avector_search(
+    keyword: str,
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    minimum_score: float = 0.2,
+    embedding: Optional[List[float]] = None,
+    notebook_id: Optional[str] = None,
+):
+    if not keyword:
+        raise InvalidInputError("Search keyword cannot be empty")
+    try:
+        embed = embedding or await asyncio.to_thread(embed_query, keyword)
+        index = get_vector_index()
+        if index and index.synced:
+            return await asyncio.to_thread(
+                _index_vector_search,
+                index,
+                embed,
+                results,
+                source,
+                note,
+                minimum_score,
+                notebook_id,
+            )
+        query, vars = await asyncio.to_thread(
+            _vector_search_query,
+            embed,
+            results,
+            source,
+            note,
+            minimum_score,
+            notebook_id,
+        )
+        return await arepo_query(query, vars)
+    except Exception as e:
+        logger.error(f"Error performing vector search: {e}")
+        raise DatabaseOperationError(e)
+
+
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Dict[str, Any]]], results: int, k: int = RRF_K
+) -> List[Dict[str, Any]]:
+    """
+    Fuses ranked result lists with reciprocal rank fusion: each item scores
+    sum(1 / (k + rank)) over the lists it appears in. Items are deduplicated by
+    parent_id, keeping the fields of the best ranked hit and all of its matches.
+    """
+    fused: Dict[str, Dict[str, Any]] = {}
+    for result_list in result_lists:
+        seen = set()
+        for rank, item in enumerate(result_list, start=1):
+            key = item.get("parent_id") or item["id"]
+            if key in seen:
+                continue
+            seen.add(key)
+            if key not in fused:
+                fused[key] = {**item, "score": 0.0, "matches": []}
+            entry = fused[key]
+            entry["score"] += 1 / (k + rank)
+            for field in ("relevance", "similarity"):
+                if field in item and field not in entry:
+                    entry[field] = item[field]
+            entry["matches"] += [
+                m for m in item.get("matches") or [] if m not in entry["matches"]
+            ]
+    ranked = sorted(fused.values(), key=lambda r: r["score"], reverse=True)
+    return ranked[:results]
+
+
+def _fuse_legs(
+    keyword: str,
+    results: int,
+    text_results: Any,
+    vector_results: Any,
+) -> List[Dict[str, Any]]:
+    legs = []
+    for name, leg in (("text", text_results), ("vector", vector_results)):
+        if isinstance(leg, Exception):
+            logger.warning(f"Hybrid search {name} leg failed for '{keyword}': {leg}")
+        else:
+            legs.append(leg or [])
+    if not legs:
+        raise DatabaseOperationError(
+            f"Hybrid search failed: {text_results}; {vector_results}"
+        )
+    return reciprocal_rank_fusion(legs, results)
+
+
+def hybrid_search(
+    keyword: str,
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    minimum_score: float = 0.2,
+    embedding: Optional[List[float]] = None,
+    notebook_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Runs the BM25 (fn::text_search) and vector searches concurrently and returns a
+    single list ranked by reciprocal rank fusion. If one of the searches fails (eg.
+    no embedding model), the results of the other one are returned.
+    """
+    if not keyword:
+        raise InvalidInputError("Search keyword cannot be empty")
+
+    def run(search, *args, **kwargs):
+        try:
+            return search(*args, **kwargs)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        text_future = executor.submit(
+            run, text_search, keyword, results, source, note, notebook_id=notebook_id
+        )
+        vector_future = executor.submit(
+            run,
+            vector_search,
+            keyword,
+            results,
+            source,
+            note,
+            minimum_score,
+            embedding=embedding,
+            notebook_id=notebook_id,
+        )
+        return _fuse_legs(
+            keyword, results, text_future.result(), vector_future.result()
+        )
+
+
+async def ahybrid_search(
+    keyword: str,
+    results: int,
+    source: bool = True,
+    note: bool = True,
+    minimum_score: float = 0.2,
+    embedding: Optional[List[float]] = None,
+    notebook_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    if not keyword:
+        raise InvalidInputError("Search keyword cannot be empty")
+    text_results, vector_results = await asyncio.gather(
+        atext_search(keyword, results, source, note, notebook_id=notebook_id),
+        avector_search(
+            keyword,
+            results,
+            source,
+            note,
+            minimum_score,
+            embedding=embedding,
+            notebook_id=notebook_id,
+        ),
+        return_exceptions=True,
+    )
+    return _fuse_legs(keyword, results, text_results, vector_results)
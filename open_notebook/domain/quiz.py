@@ -3,7 +3,7 @@ from datetime import datetime
 from typing import List, Optional, Dict, Any
 from open_notebook.graphs.utils import provision_langchain_model
 from open_notebook.database.repository import repo_create, repo_query, repo_upsert
-from open_notebook.domain.models import model_manager
+from open_notebook.domain.embedding import embed_text, get_embedding_model
 import json
 
 def _extract_model_text(resp):
@@ -132,10 +132,9 @@ def save_question_record(q: Dict[str,Any], notebook_id: Optional[str]=None):
     return repo_create("quiz_questions", rec)
 
 def embed_and_store_question(question_id:str, question_text:str):
-    EMB = model_manager.embedding_model
-    if not EMB:
+    if not get_embedding_model():
         return None
-    embedding = EMB.embed([question_text])[0]
+    embedding = embed_text(question_text)
     # update record with embedding
     repo_upsert("quiz_questions", {"id": question_id, "embedding": embedding})
     return embedding
@@ -1,4 +1,4 @@
-from typing import ClassVar, Optional
+from typing import ClassVar, Literal, Optional
 
 from pydantic import Field
 
@@ -12,6 +12,10 @@ class Transformation(ObjectModel):
     description: str
     prompt: str
     apply_default: bool
+    # map_reduce runs the prompt on chunks of the text in parallel and combines the
+    # partial results with reduce_prompt, for texts too long for a single call
+    mode: Literal["single", "map_reduce"] = "single"
+    reduce_prompt: Optional[str] = None
 
 
 class DefaultPrompts(RecordModel):
@@ -0,0 +1,872 @@
+import argparse
+import fcntl
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+from loguru import logger
+
+from open_notebook.config import CONFIG, VECTOR_INDEX_FOLDER
+from open_notebook.database.repository import repo_query
+
+KINDS = ("source_embedding", "source_insight", "note")
+SOURCE_KINDS = (0, 1)
+NOTE_KINDS = (2,)
+
+# Rows scored per matrix product, bounds memory use on large memory-mapped indexes
+SEARCH_BLOCK_ROWS = 65_536
+REBUILD_PAGE_SIZE = 1_000
+# Compaction waits for at least this many tombstoned rows, whatever the ratio
+COMPACT_MIN_ROWS = 1_000
+# Build written to until a rebuild makes another one current
+INITIAL_BUILD = "build-0"
+# Files of the index before it was split in builds
+LEGACY_FILES = ("vectors.f32", "index.sqlite", "index.sqlite-wal", "index.sqlite-shm")
+
+
+def vector_backend() -> str:
+    """Vector search backend selected in open_notebook_config.yaml (surreal or numpy)"""
+    return ((CONFIG.get("vector_search") or {}).get("backend") or "surreal").lower()
+
+
+def compact_ratio() -> float:
+    """Share of tombstoned rows above which maintain() compacts the index"""
+    return float((CONFIG.get("vector_search") or {}).get("compact_ratio", 0.3))
+
+
+@dataclass
+class VectorEntry:
+    id: str
+    kind: str
+    parent_id: str
+    title: Optional[str]
+    content: Optional[str]
+    embedding: Sequence[float]
+    insight_type: Optional[str] = None
+
+
+def _normalized(
+    entries: Sequence[VectorEntry],
+) -> Tuple[List[VectorEntry], Optional[np.ndarray]]:
+    entries = [e for e in entries if e.embedding is not None and len(e.embedding)]
+    if not entries:
+        return entries, None
+    matrix = np.asarray([e.embedding for e in entries], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    return entries, matrix
+
+
+class _Build:
+    """
+    One build of the index: normalized float32 vectors in a memory-mapped matrix
+    (vectors.f32) and the ids, parents, titles and content of each row in a SQLite
+    sidecar (index.sqlite). Callers serialize access to it with the VectorIndex lock.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.name = os.path.basename(folder)
+        os.makedirs(folder, exist_ok=True)
+        self.vectors_path = os.path.join(folder, "vectors.f32")
+        self.sidecar_path = os.path.join(folder, "index.sqlite")
+        self._db = sqlite3.connect(
+            self.sidecar_path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                kind INTEGER NOT NULL,
+                parent_id TEXT,
+                title TEXT,
+                insight_type TEXT,
+                content TEXT,
+                deleted INTEGER NOT NULL DEFAULT 0,
+                seq INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_id ON entries (id);
+            CREATE INDEX IF NOT EXISTS idx_entries_parent ON entries (parent_id);
+            CREATE INDEX IF NOT EXISTS idx_entries_seq ON entries (seq);
+            CREATE TABLE IF NOT EXISTS edits (
+                seq INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                removed INTEGER NOT NULL,
+                title TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_edits_seq ON edits (seq);
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+            """
+        )
+        self.dimension: Optional[int] = None
+        self.synced = False
+        self.seq = 0
+        self.generation: Optional[str] = None
+        self._vectors: Optional[np.memmap] = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._kinds = np.zeros(0, dtype=np.int8)
+        self.refresh()
+
+    def close(self) -> None:
+        self._vectors = None
+        self._db.close()
+
+    # Storage
+
+    def _info(self, key: str) -> Optional[str]:
+        row = self._db.execute(
+            "SELECT value FROM info WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, key: str, value: Any) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _map_vectors(self, rows: int) -> None:
+        if not self.dimension or rows == 0:
+            self._vectors = None
+            return
+        if self._vectors is not None and self._vectors.shape[0] >= rows:
+            return
+        size = os.path.getsize(self.vectors_path)
+        capacity = size // (self.dimension * 4)
+        self._vectors = np.memmap(
+            self.vectors_path,
+            dtype=np.float32,
+            mode="r+",
+            shape=(capacity, self.dimension),
+        )
+
+    def _grow(self, rows: int) -> None:
+        # Capacity doubles so appends stay amortized O(1)
+        current = (
+            os.path.getsize(self.vectors_path) // (self.dimension * 4)
+            if os.path.exists(self.vectors_path)
+            else 0
+        )
+        if rows <= current:
+            self._map_vectors(rows)
+            return
+        capacity = max(rows, current * 2, 1024)
+        self._vectors = None
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._map_vectors(rows)
+
+    def refresh(self) -> None:
+        """Replays the rows changed by any process since the last refresh"""
+        seq = int(self._info("seq") or 0)
+        generation = self._info("generation")
+        if seq == self.seq and generation == self.generation:
+            return
+        if generation != self.generation:
+            # The build was reset (possibly by another process), replay everything
+            dimension = self._info("dimension")
+            self.dimension = int(dimension) if dimension else None
+            self._alive = np.zeros(0, dtype=bool)
+            self._kinds = np.zeros(0, dtype=np.int8)
+            self._vectors = None
+            self.seq = 0
+            self.generation = generation
+        changed = self._db.execute(
+            "SELECT row, kind, deleted FROM entries WHERE seq > ?", (self.seq,)
+        ).fetchall()
+        if changed:
+            rows = max(row for row, _, _ in changed) + 1
+            if rows > len(self._alive):
+                self._alive = np.concatenate(
+                    [self._alive, np.zeros(rows - len(self._alive), dtype=bool)]
+                )
+                self._kinds = np.concatenate(
+                    [self._kinds, np.zeros(rows - len(self._kinds), dtype=np.int8)]
+                )
+            changed_rows = np.array([row for row, _, _ in changed])
+            self._kinds[changed_rows] = [kind for _, kind, _ in changed]
+            self._alive[changed_rows] = [not deleted for _, _, deleted in changed]
+        self._map_vectors(len(self._alive))
+        self.synced = bool(self._info("synced"))
+        self.seq = seq
+
+    @contextmanager
+    def transaction(self) -> Iterator[int]:
+        """Write transaction, yields the seq its changes are recorded with"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            seq = int(self._info("seq") or 0) + 1
+            yield seq
+            self.set_info("seq", seq)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            self.generation = None
+            raise
+        finally:
+            self.refresh()
+
+    def _reset(self, dimension: Optional[int]) -> None:
+        # Must be called inside a write transaction. The vectors file is not truncated
+        # because other processes may still have it mapped, rows are simply reused.
+        self._db.execute("DELETE FROM entries")
+        self._db.execute("DELETE FROM info WHERE key IN ('dimension', 'synced')")
+        if dimension:
+            self.set_info("dimension", dimension)
+        self.set_info("generation", int(self._info("generation") or 0) + 1)
+        self.dimension = dimension
+        self._vectors = None
+
+    # Writes, inside a transaction
+
+    def insert(
+        self, entries: Sequence[VectorEntry], matrix: np.ndarray, seq: int
+    ) -> None:
+        """Appends the entries with their normalized vectors, replacing the same ids"""
+        if int(self._info("dimension") or 0) != matrix.shape[1]:
+            if self._info("dimension"):
+                logger.warning(
+                    f"Embedding dimension changed to {matrix.shape[1]}, resetting the vector index"
+                )
+            self._reset(matrix.shape[1])
+        for start in range(0, len(entries), 500):
+            ids = tuple(e.id for e in entries[start : start + 500])
+            self.tombstone(f"id IN ({','.join('?' * len(ids))})", ids, seq)
+        first = self._db.execute(
+            "SELECT COALESCE(MAX(row), -1) + 1 FROM entries"
+        ).fetchone()[0]
+        self._grow(first + len(entries))
+        self._vectors[first : first + len(entries)] = matrix
+        self._vectors.flush()
+        self._db.executemany(
+            """
+            INSERT INTO entries (row, id, kind, parent_id, title, insight_type, content, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    first + offset,
+                    e.id,
+                    KINDS.index(e.kind),
+                    e.parent_id,
+                    e.title,
+                    e.insight_type,
+                    e.content,
+                    seq,
+                )
+                for offset, e in enumerate(entries)
+            ],
+        )
+
+    def tombstone(self, where: str, params: Tuple, seq: int) -> None:
+        self._db.execute(
+            f"UPDATE entries SET deleted = 1, seq = ? WHERE deleted = 0 AND {where}",
+            (seq, *params),
+        )
+
+    def update(
+        self, set_clause: str, set_params: Tuple, where: str, params: Tuple, seq: int
+    ) -> None:
+        self._db.execute(
+            f"UPDATE entries SET {set_clause}, seq = ? WHERE deleted = 0 AND {where}",
+            (*set_params, seq, *params),
+        )
+
+    def retitle(self, parent_id: str, title: Optional[str], seq: int) -> None:
+        self.update(
+            "title = ?", (title,), "parent_id = ? AND kind IN (0, 1)", (parent_id,), seq
+        )
+
+    def record_edits(
+        self, ids: Sequence[str], seq: int, removed: bool, title: Optional[str] = None
+    ) -> None:
+        # Replayed onto a build made meanwhile, which may hold rows of these ids that
+        # this one doesn't: removals of ids or parents, or new titles of parents
+        self._db.executemany(
+            "INSERT INTO edits (seq, id, removed, title) VALUES (?, ?, ?, ?)",
+            [(seq, id, removed, title) for id in ids],
+        )
+
+    # Copies between builds
+
+    def append(self, entries: Sequence[VectorEntry]) -> None:
+        entries, matrix = _normalized(entries)
+        if matrix is not None:
+            with self.transaction() as seq:
+                self.insert(entries, matrix, seq)
+
+    def copy_live_rows(self, target: "_Build") -> Tuple[int, Optional[str]]:
+        """
+        Appends the live rows to `target`. Reads a snapshot through a connection of
+        its own, so it runs without the index lock. Returns the seq and generation
+        of the snapshot.
+        """
+        db = sqlite3.connect(self.sidecar_path, isolation_level=None)
+        try:
+            db.execute("BEGIN")
+            info = dict(db.execute("SELECT key, value FROM info").fetchall())
+            dimension = int(info.get("dimension") or 0)
+            cursor = db.execute(
+                """
+                SELECT row, id, kind, parent_id, title, insight_type, content
+                FROM entries WHERE deleted = 0 ORDER BY row
+                """
+            )
+            # Rows are never rewritten within a generation, the snapshot's are stable
+            vectors = (
+                np.memmap(self.vectors_path, dtype=np.float32, mode="r").reshape(
+                    -1, dimension
+                )
+                if dimension and os.path.exists(self.vectors_path)
+                else None
+            )
+            while vectors is not None:
+                rows = cursor.fetchmany(REBUILD_PAGE_SIZE)
+                if not rows:
+                    break
+                target.append(
+                    [
+                        VectorEntry(
+                            id=id,
+                            kind=KINDS[kind],
+                            parent_id=parent_id,
+                            title=title,
+                            content=content,
+                            embedding=vectors[row],
+                            insight_type=insight_type,
+                        )
+                        for row, id, kind, parent_id, title, insight_type, content in rows
+                    ]
+                )
+            db.execute("COMMIT")
+        finally:
+            db.close()
+        return int(info.get("seq") or 0), info.get("generation")
+
+    def changes_since(self, seq: int) -> List[Tuple[str, Any]]:
+        """
+        Rows written and edits made after `seq`, in order, as ("upsert", entry),
+        ("remove", id) and ("retitle", (parent id, title)). Must be called inside a
+        transaction, after refresh.
+        """
+        changes: List[Tuple[int, str, Any]] = [
+            (
+                row_seq,
+                "upsert",
+                VectorEntry(
+                    id=id,
+                    kind=KINDS[kind],
+                    parent_id=parent_id,
+                    title=title,
+                    content=content,
+                    embedding=np.array(self._vectors[row]),
+                    insight_type=insight_type,
+                ),
+            )
+            for row, id, kind, parent_id, title, insight_type, content, row_seq in self._db.execute(
+                """
+                SELECT row, id, kind, parent_id, title, insight_type, content, seq
+                FROM entries WHERE deleted = 0 AND seq > ?
+                """,
+                (seq,),
+            )
+        ]
+        changes += [
+            (edit_seq, "remove", id) if removed else (edit_seq, "retitle", (id, title))
+            for edit_seq, id, removed, title in self._db.execute(
+                "SELECT seq, id, removed, title FROM edits WHERE seq > ?", (seq,)
+            )
+        ]
+        changes.sort(key=lambda change: change[0])
+        return [(action, value) for _, action, value in changes]
+
+    def replay(self, changes: Sequence[Tuple[str, Any]]) -> None:
+        """Applies the changes_since of another build"""
+        batch: List[VectorEntry] = []
+        for action, value in changes:
+            if action == "upsert":
+                batch.append(value)
+                continue
+            self.append(batch)
+            batch = []
+            with self.transaction() as seq:
+                if action == "remove":
+                    self.tombstone("(id = ? OR parent_id = ?)", (value, value), seq)
+                else:
+                    self.retitle(*value, seq)
+        self.append(batch)
+
+    # Reads
+
+    def _rows_for_parents(self, parent_ids: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        parent_ids = list(parent_ids)
+        for start in range(0, len(parent_ids), 500):
+            batch = parent_ids[start : start + 500]
+            rows += [
+                row
+                for (row,) in self._db.execute(
+                    f"SELECT row FROM entries WHERE deleted = 0 AND parent_id IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+            ]
+        candidates = np.array(sorted(rows), dtype=np.int64)
+        # Rows appended by another process since the last refresh are skipped
+        return candidates[candidates < len(self._alive)]
+
+    def _top_rows(
+        self,
+        query: np.ndarray,
+        k: int,
+        kinds: Tuple[int, ...],
+        candidates: Optional[np.ndarray] = None,
+    ) -> List[Tuple[int, float]]:
+        if self._vectors is None or k <= 0:
+            return []
+        total = len(self._alive) if candidates is None else len(candidates)
+        candidate_rows: List[np.ndarray] = []
+        candidate_scores: List[np.ndarray] = []
+        for start in range(0, total, SEARCH_BLOCK_ROWS):
+            end = min(total, start + SEARCH_BLOCK_ROWS)
+            if candidates is None:
+                block: Any = slice(start, end)
+                row_ids = np.arange(start, end)
+            else:
+                block = row_ids = candidates[start:end]
+            mask = self._alive[block] & np.isin(self._kinds[block], kinds)
+            if not mask.any():
+                continue
+            scores = np.asarray(self._vectors[block] @ query)
+            scores[~mask] = -np.inf
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            candidate_rows.append(row_ids[top])
+            candidate_scores.append(scores[top])
+        if not candidate_rows:
+            return []
+        all_rows = np.concatenate(candidate_rows)
+        all_scores = np.concatenate(candidate_scores)
+        if len(all_scores) > k:
+            top = np.argpartition(all_scores, -k)[-k:]
+            all_rows, all_scores = all_rows[top], all_scores[top]
+        order = np.argsort(-all_scores)
+        return [
+            (int(all_rows[i]), float(all_scores[i]))
+            for i in order
+            if np.isfinite(all_scores[i])
+        ]
+
+    def search_rows(
+        self,
+        query: Sequence[float],
+        match_count: int,
+        sources: bool,
+        notes: bool,
+        min_similarity: float,
+        parent_ids: Optional[Sequence[str]],
+    ) -> Tuple[List[Tuple], Dict[int, float]]:
+        """Entries of the best scoring rows, and the score of each row"""
+        if not self.dimension:
+            return [], {}
+        vector = np.asarray(query, dtype=np.float32)
+        if vector.shape[0] != self.dimension:
+            logger.warning(
+                f"Query has {vector.shape[0]} dimensions but the vector index has {self.dimension}, rebuild the index after changing embedding models"
+            )
+            return [], {}
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+
+        candidates = (
+            self._rows_for_parents(parent_ids) if parent_ids is not None else None
+        )
+        # Like the database function, each table contributes up to match_count rows
+        hits: List[Tuple[int, float]] = []
+        if sources:
+            for kind in SOURCE_KINDS:
+                hits += self._top_rows(vector, match_count, (kind,), candidates)
+        if notes:
+            hits += self._top_rows(vector, match_count, NOTE_KINDS, candidates)
+        hits = [(row, score) for row, score in hits if score >= min_similarity]
+        if not hits:
+            return [], {}
+        scores = dict(hits)
+        placeholders = ",".join("?" * len(scores))
+        rows = self._db.execute(
+            f"SELECT row, id, kind, parent_id, title, insight_type, content FROM entries WHERE row IN ({placeholders})",
+            tuple(scores),
+        ).fetchall()
+        return rows, scores
+
+    @property
+    def size(self) -> int:
+        return int(self._alive.sum())
+
+    def tombstones(self) -> Tuple[int, int]:
+        total, deleted = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(deleted), 0) FROM entries"
+        ).fetchone()
+        return int(total), int(deleted)
+
+
+class VectorIndex:
+    """
+    In-process vector index used instead of the fn::vector_search database function.
+
+    The index is stored in the build folder named by the CURRENT file (see _Build).
+    Rows are only appended to a build: updates append a new row and tombstone the old
+    one, so other processes pick up changes by replaying the rows touched since their
+    last read. Rebuilding and compacting fill a new build without holding the index,
+    replay onto it the changes made meanwhile and swap it in under a short lock.
+    They run from the workers (see maintain) or the command line, never from a search.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.current_path = os.path.join(folder, "CURRENT")
+        self._lock = threading.RLock()
+        self._build: Optional[_Build] = None
+        with self._lock:
+            self._current()
+
+    def _current_name(self) -> str:
+        try:
+            with open(self.current_path, encoding="utf-8") as f:
+                return f.read().strip() or INITIAL_BUILD
+        except FileNotFoundError:
+            return INITIAL_BUILD
+
+    def _current(self) -> _Build:
+        # Must be called with the lock held, follows the swaps made by any process
+        name = self._current_name()
+        if self._build is None or self._build.name != name:
+            if self._build is not None:
+                self._build.close()
+            self._build = _Build(os.path.join(self.folder, name))
+        else:
+            self._build.refresh()
+        return self._build
+
+    # Writes
+
+    def _write(self, change: Callable[[_Build, int], None]) -> None:
+        with self._lock:
+            while True:
+                build = self._current()
+                with build.transaction() as seq:
+                    # Another process may have swapped in a new build while this one
+                    # waited for the write lock, writing here would be lost
+                    if self._current_name() == build.name:
+                        change(build, seq)
+                        return
+
+    def upsert(self, entries: Sequence[VectorEntry]) -> None:
+        entries, matrix = _normalized(entries)
+        if matrix is not None:
+            self._write(lambda build, seq: build.insert(entries, matrix, seq))
+
+    def remove(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        if not ids:
+            return
+
+        def change(build: _Build, seq: int) -> None:
+            for start in range(0, len(ids), 500):
+                batch = tuple(ids[start : start + 500])
+                build.tombstone(f"id IN ({','.join('?' * len(batch))})", batch, seq)
+            build.record_edits(ids, seq, removed=True)
+
+        self._write(change)
+
+    def remove_parent(self, parent_id: str) -> None:
+        """Removes a source together with its chunks and insights"""
+
+        def change(build: _Build, seq: int) -> None:
+            build.tombstone("(parent_id = ? OR id = ?)", (parent_id, parent_id), seq)
+            build.record_edits([parent_id], seq, removed=True)
+
+        self._write(change)
+
+    def retitle(self, parent_id: str, title: Optional[str]) -> None:
+        def change(build: _Build, seq: int) -> None:
+            build.retitle(parent_id, title, seq)
+            build.record_edits([parent_id], seq, removed=False, title=title)
+
+        self._write(change)
+
+    # Reads
+
+    def search(
+        self,
+        query: Sequence[float],
+        match_count: int,
+        sources: bool = True,
+        notes: bool = True,
+        min_similarity: float = 0.2,
+        parent_ids: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Same contract and result shape as the fn::vector_search database function.
+        When `parent_ids` is given only rows of those sources/notes are scored.
+        """
+        with self._lock:
+            rows, scores = self._current().search_rows(
+                query, match_count, sources, notes, min_similarity, parent_ids
+            )
+
+        grouped: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for row, id, kind, parent_id, title, insight_type, content in rows:
+            if KINDS[kind] == "source_embedding":
+                id = parent_id
+            if KINDS[kind] == "source_insight":
+                title = f"{insight_type} - {title or ''}"
+            key = (id, parent_id, title)
+            result = grouped.setdefault(
+                key,
+                dict(
+                    id=id, parent_id=parent_id, title=title, similarity=0.0, matches=[]
+                ),
+            )
+            result["similarity"] = max(result["similarity"], scores[row])
+            result["matches"].append(content)
+        results = sorted(grouped.values(), key=lambda r: r["similarity"], reverse=True)
+        return results[:match_count]
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return self._current().size
+
+    @property
+    def synced(self) -> bool:
+        """
+        Whether the index was built from the database, searches need it to be.
+        Never waits: while another thread holds the index, the last known answer
+        """
+        if self._lock.acquire(blocking=False):
+            try:
+                self._current()
+            finally:
+                self._lock.release()
+        build = self._build
+        return build is not None and build.synced
+
+    def tombstones(self) -> Tuple[int, int]:
+        """Rows of the vectors file in use and how many of them are tombstoned"""
+        with self._lock:
+            return self._current().tombstones()
+
+    # Builds
+
+    def _swap(
+        self,
+        build: _Build,
+        base_name: str,
+        since: int,
+        generation: Optional[str],
+        from_database: bool,
+    ) -> bool:
+        with self._lock:
+            base = self._current()
+            if base.name != base_name:
+                logger.warning(
+                    "The vector index was swapped meanwhile, dropping this build"
+                )
+                return False
+            # Holding the write lock of the current build, no process writes to it
+            # until the new build is current
+            with base.transaction():
+                base.refresh()
+                if base.generation != generation:
+                    logger.warning(
+                        "The vector index was reset meanwhile, dropping this build"
+                    )
+                    return False
+                build.replay(base.changes_since(since))
+                with build.transaction():
+                    if from_database or base.synced:
+                        build.set_info("synced", 1)
+                with open(f"{self.current_path}.tmp", "w", encoding="utf-8") as f:
+                    f.write(build.name)
+                os.replace(f"{self.current_path}.tmp", self.current_path)
+            base.close()
+            self._build = build
+        # The replaced build is kept for processes that haven't noticed the swap yet,
+        # the ones before it, abandoned builds and the pre-build layout go
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            if name.startswith("build-") and name not in (base_name, build.name):
+                shutil.rmtree(path, ignore_errors=True)
+            elif name in LEGACY_FILES:
+                os.remove(path)
+        return True
+
+    def _new_build(
+        self,
+        fill: Callable[[_Build], Tuple[str, int, Optional[str]]],
+        from_database: bool,
+    ) -> bool:
+        """
+        Fills a new build without holding the index and swaps it in. `fill` returns
+        the name, seq and generation of the current build it started from, the
+        changes made to that build since are replayed onto the new one first.
+        Returns False when another process is building or swapped in a build first.
+        """
+        with open(os.path.join(self.folder, "build.lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("The vector index is already being built elsewhere")
+                return False
+            build = _Build(os.path.join(self.folder, f"build-{uuid.uuid4().hex[:12]}"))
+            swapped = False
+            try:
+                swapped = self._swap(build, *fill(build), from_database)
+            finally:
+                if not swapped:
+                    build.close()
+                    shutil.rmtree(build.folder, ignore_errors=True)
+        return swapped
+
+    def _load_database(self, build: _Build) -> None:
+        queries = {
+            "source_embedding": "SELECT id, source.id AS parent_id, source.title AS title, content, embedding FROM source_embedding WHERE embedding != NONE",
+            "source_insight": "SELECT id, source.id AS parent_id, source.title AS title, insight_type, content, embedding FROM source_insight WHERE embedding != NONE",
+            "note": "SELECT id, id AS parent_id, title, content, embedding FROM note WHERE embedding != NONE",
+        }
+        for kind, query in queries.items():
+            start = 0
+            while True:
+                page = repo_query(f"{query} START {start} LIMIT {REBUILD_PAGE_SIZE};")
+                if build.dimension is None and page:
+                    dimension = len(page[0]["embedding"])
+                else:
+                    dimension = build.dimension
+                build.append(
+                    [
+                        VectorEntry(
+                            id=record["id"],
+                            kind=kind,
+                            parent_id=record.get("parent_id"),
+                            title=record.get("title"),
+                            content=record.get("content"),
+                            embedding=record["embedding"],
+                            insight_type=record.get("insight_type"),
+                        )
+                        for record in page
+                        if record.get("embedding")
+                        and len(record["embedding"]) == dimension
+                    ]
+                )
+                if len(page) < REBUILD_PAGE_SIZE:
+                    break
+                start += REBUILD_PAGE_SIZE
+
+    def rebuild(self) -> None:
+        """
+        Reloads every stored embedding from SurrealDB into a new build, searches keep
+        using the current one until then
+        """
+        logger.info("Rebuilding the vector index from the database")
+
+        def fill(build: _Build) -> Tuple[str, int, Optional[str]]:
+            with self._lock:
+                base = self._current()
+                started = (base.name, base.seq, base.generation)
+            self._load_database(build)
+            return started
+
+        if self._new_build(fill, from_database=True):
+            logger.info(f"Vector index rebuilt with {self.size} vectors")
+
+    def compact(self) -> None:
+        """
+        Copies the live rows to a new build, leaving the tombstoned ones behind.
+        Other processes replay the index from scratch afterwards, like after a rebuild.
+        """
+
+        def fill(build: _Build) -> Tuple[str, int, Optional[str]]:
+            with self._lock:
+                base = self._current()
+            return (base.name, *base.copy_live_rows(build))
+
+        if self._new_build(fill, from_database=False):
+            logger.info(f"Vector index compacted to {self.size} rows")
+
+    def maintain(self) -> None:
+        """
+        Builds the index from the database when it never was, and compacts it once
+        compact_ratio of its rows are tombstoned
+        """
+        if not self.synced:
+            self.rebuild()
+            return
+        total, deleted = self.tombstones()
+        if deleted >= COMPACT_MIN_ROWS and deleted > total * compact_ratio():
+            logger.info(
+                f"Compacting the vector index, {deleted} of {total} rows tombstoned"
+            )
+            self.compact()
+
+
+_index: Optional[VectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> Optional[VectorIndex]:
+    """The shared in-process index, or None when the surreal backend is configured"""
+    global _index
+    if vector_backend() != "numpy":
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = VectorIndex(VECTOR_INDEX_FOLDER)
+    return _index
+
+
+def maintain_vector_index() -> None:
+    """VectorIndex.maintain on the shared index, when the numpy backend is configured"""
+    index = get_vector_index()
+    if index:
+        index.maintain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Maintains the numpy vector index")
+    parser.add_argument(
+        "action",
+        choices=("maintain", "rebuild", "compact"),
+        nargs="?",
+        default="maintain",
+        help="maintain rebuilds or compacts only when needed (the default)",
+    )
+    args = parser.parse_args()
+    index = get_vector_index()
+    if index is None:
+        parser.exit(1, "The vector_search backend is not numpy, nothing to do\n")
+    getattr(index, args.action)()
+
+
+if __name__ == "__main__":
+    main()
@@ -68,3 +68,9 @@ class NoTranscriptFound(OpenNotebookError):
     """Raised when no transcript is found for a video."""
 
     pass
+
+
+class JobLeaseLostError(OpenNotebookError):
+    """Raised when a background job is no longer leased to the worker running it."""
+
+    pass
@@ -1,18 +1,25 @@
+import asyncio
 import operator
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 
 from ai_prompter import Prompter
 from langchain_core.output_parsers.pydantic import PydanticOutputParser
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
 from langgraph.types import Send
+from loguru import logger
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 
 import os
 import google.generativeai as genai
 
-from open_notebook.domain.notebook import vector_search
+from open_notebook.domain.embedding import embed_queries
+from open_notebook.domain.notebook import (
+    ahybrid_search,
+    atext_search,
+    reciprocal_rank_fusion,
+)
 from open_notebook.graphs.utils import provision_langchain_model
 from open_notebook.utils import clean_thinking_content
 
@@ -20,6 +27,7 @@ from open_notebook.utils import clean_thinking_content
 class SubGraphState(TypedDict):
     question: str
     term: str
+    embedding: Optional[List[float]]
     # type: Literal["text", "vector"]
     instructions: str
     results: dict
@@ -77,6 +85,14 @@ async def call_model_with_messages(state: ThreadState, config: RunnableConfig) -
 
 
 async def trigger_queries(state: ThreadState, config: RunnableConfig):
+    searches = state["strategy"].searches
+    # All search terms are embedded in one provider call before fanning out
+    try:
+        embeddings = await asyncio.to_thread(embed_queries, [s.term for s in searches])
+    except Exception as e:
+        # No embedding model or a provider error, the searches fall back to text
+        logger.warning(f"Could not embed the search terms: {e}")
+        embeddings = [None] * len(searches)
     return [
         Send(
             "provide_answer",
@@ -84,19 +100,28 @@ async def trigger_queries(state: ThreadState, config: RunnableConfig):
                 "question": state["question"],
                 "instructions": s.instructions,
                 "term": s.term,
+                "embedding": embedding,
                 # "type": s.type,
             },
         )
-        for s in state["strategy"].searches
+        for s, embedding in zip(searches, embeddings)
     ]
 
 
 async def provide_answer(state: SubGraphState, config: RunnableConfig) -> dict:
-    payload = state
+    payload = {key: value for key, value in state.items() if key != "embedding"}
     # if state["type"] == "text":
     #     results = text_search(state["term"], 10, True, True)
     # else:
-    results = vector_search(state["term"], 10, True, True)
+    if state.get("embedding") is None:
+        # The terms could not be embedded (see trigger_queries), BM25 only
+        results = reciprocal_rank_fusion(
+            [await atext_search(state["term"], 10, True, True)], 10
+        )
+    else:
+        results = await ahybrid_search(
+            state["term"], 10, True, True, embedding=state["embedding"]
+        )
     if len(results) == 0:
         return {"answers": []}
     payload["results"] = results
@@ -109,7 +134,7 @@ async def provide_answer(state: SubGraphState, config: RunnableConfig) -> dict:
         "tools",
         max_tokens=2000,
     )
-    ai_message = model.invoke(system_prompt)
+    ai_message = await model.ainvoke(system_prompt)
     return {"answers": [clean_thinking_content(ai_message.content)]}
 
 
@@ -1,5 +1,7 @@
+import asyncio
 import operator
-from typing import Any, Dict, List, Optional
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from content_core import extract_content
 from content_core.common import ProcessSourceState
@@ -13,7 +15,7 @@ from open_notebook.domain.content_settings import ContentSettings
 from open_notebook.domain.notebook import Asset, Source
 from open_notebook.domain.transformation import Transformation
 from open_notebook.graphs.transformation import graph as transform_graph
-from open_notebook.utils import surreal_clean
+from open_notebook.utils import content_fingerprint, surreal_clean
 
 
 class SourceState(TypedDict):
@@ -23,6 +25,10 @@ class SourceState(TypedDict):
     source: Source
     transformation: Annotated[list, operator.add]
     embed: bool
+    # Stored by finish_source, once everything else succeeded
+    fingerprint: Optional[str]
+    # The content was ingested before, its source was added to the notebook
+    reused: bool
 
 
 class TransformationState(TypedDict):
@@ -30,23 +36,90 @@ class TransformationState(TypedDict):
     transformation: Transformation
 
 
-async def content_process(state: SourceState) -> dict:
+def extraction_options() -> Dict[str, str]:
+    """Options for extract_content, from the content settings"""
     content_settings = ContentSettings()
-    content_state: Dict[str, Any] = state["content_state"]
+    return {
+        "url_engine": content_settings.default_content_processing_engine_url or "auto",
+        "document_engine": content_settings.default_content_processing_engine_doc
+        or "auto",
+        "output_format": "markdown",
+    }
 
-    content_state["url_engine"] = (
-        content_settings.default_content_processing_engine_url or "auto"
-    )
-    content_state["document_engine"] = (
-        content_settings.default_content_processing_engine_doc or "auto"
+
+async def _reuse_source(source: Source, notebook_id: Optional[str]) -> dict:
+    logger.info(f"Same content was ingested before, reusing source {source.id}")
+    if notebook_id and not await source.ain_notebook(notebook_id):
+        await source.aadd_to_notebook(notebook_id)
+    return {"source": source, "reused": True}
+
+
+async def _missing_transformations(
+    source: Source, transformations: List[Transformation]
+) -> List[Transformation]:
+    """The transformations whose insight the source doesn't have yet"""
+    if not transformations:
+        return []
+    insights = await asyncio.to_thread(lambda: source.insights)
+    done = {insight.insight_type for insight in insights}
+    return [t for t in transformations if t.title not in done]
+
+
+async def find_existing_source(state: SourceState) -> dict:
+    content_state = state["content_state"]
+    if isinstance(content_state, ProcessSourceState):
+        content_state = content_state.model_dump()
+    # Given by callers that looked the content up before extracting it
+    fingerprint = state.get("fingerprint") or content_fingerprint(
+        file_path=content_state.get("file_path"),
+        url=content_state.get("url"),
+        content=content_state.get("content"),
     )
-    content_state["output_format"] = "markdown"
+    if not fingerprint:
+        return {"fingerprint": None}
+    source = await Source.afind_by_fingerprint(fingerprint)
+    if source is None:
+        return {"fingerprint": fingerprint}
+    if content_state.get("delete_source") and content_state.get("file_path"):
+        # Extraction would have removed the upload
+        os.remove(content_state["file_path"])
+    # Still embedded and transformed as requested, if it wasn't already
+    missing = await _missing_transformations(source, state["apply_transformations"])
+    if missing:
+        # Once here rather than by each transform_content
+        await source.aload_lazy_fields()
+    return {
+        "fingerprint": fingerprint,
+        **await _reuse_source(source, state["notebook_id"]),
+        "apply_transformations": missing,
+    }
+
+
+def route_new_content(state: SourceState) -> str:
+    return "embed_source" if state.get("reused") else "content_process"
+
+
+def route_extracted_content(state: SourceState) -> str:
+    # Urls are only identified by what was fetched from them, look them up again
+    return "save_source" if state.get("fingerprint") else "find_extracted_source"
+
+
+def route_extracted_source(state: SourceState) -> str:
+    return "embed_source" if state.get("reused") else "save_source"
+
+
+async def content_process(state: SourceState) -> dict:
+    if isinstance(state["content_state"], ProcessSourceState):
+        # Already extracted, eg. by the bulk ingest process pool
+        return {}
+    content_state: Dict[str, Any] = state["content_state"]
+    content_state.update(extraction_options())
 
     processed_state = await extract_content(content_state)
     return {"content_state": processed_state}
 
 
-def save_source(state: SourceState) -> dict:
+async def save_source(state: SourceState) -> dict:
     content_state = state["content_state"]
 
     source = Source(
@@ -54,22 +127,38 @@ def save_source(state: SourceState) -> dict:
         full_text=surreal_clean(content_state.content),
         title=content_state.title,
     )
-    source.save()
+    await source.asave()
 
     if state["notebook_id"]:
         logger.debug(f"Adding source to notebook {state['notebook_id']}")
-        source.add_to_notebook(state["notebook_id"])
-
-    if state["embed"]:
-        logger.debug("Embedding content for vector search")
-        source.vectorize()
+        try:
+            await source.aadd_to_notebook(state["notebook_id"])
+        except Exception:
+            # The source was not reported yet, nobody else can remove it
+            await asyncio.to_thread(source.delete)
+            raise
 
     return {"source": source}
 
 
-def trigger_transformations(state: SourceState, config: RunnableConfig) -> List[Send]:
+async def embed_source(state: SourceState) -> dict:
+    # A node of its own so that the saved source is reported (see run_source_graph)
+    # before embedding, which can fail
+    source = state["source"]
+    if not state["embed"]:
+        return {}
+    if state.get("reused") and await asyncio.to_thread(lambda: source.embedded_chunks):
+        return {}
+    logger.debug("Embedding content for vector search")
+    await source.avectorize()
+    return {}
+
+
+def trigger_transformations(
+    state: SourceState, config: RunnableConfig
+) -> Union[str, List[Send]]:
     if len(state["apply_transformations"]) == 0:
-        return []
+        return "finish_source"
 
     to_apply = state["apply_transformations"]
     logger.debug(f"Applying transformations {to_apply}")
@@ -88,6 +177,8 @@ def trigger_transformations(state: SourceState, config: RunnableConfig) -> List[
 
 async def transform_content(state: TransformationState) -> Optional[dict]:
     source = state["source"]
+    # Reused sources are read without their text
+    await source.aload_lazy_fields()
     content = source.full_text
     if not content:
         return None
@@ -97,37 +188,114 @@ async def transform_content(state: TransformationState) -> Optional[dict]:
     result = await transform_graph.ainvoke(
         dict(input_text=content, transformation=transformation)
     )
-    source.add_insight(transformation.title, surreal_clean(result["output"]))
     return {
         "transformation": [
             {
                 "output": result["output"],
                 "transformation_name": transformation.name,
+                "insight_type": transformation.title,
             }
         ]
     }
 
 
+async def save_insights(state: SourceState) -> dict:
+    # Once all transformations are done, so their insights are embedded and
+    # inserted together
+    await state["source"].aadd_insights(
+        [(t["insight_type"], t["output"]) for t in state["transformation"]]
+    )
+    return {}
+
+
+async def finish_source(state: SourceState) -> dict:
+    source = state["source"]
+    fingerprint = state.get("fingerprint")
+    if state.get("reused") or not fingerprint:
+        return {}
+    try:
+        await source.aset_fingerprint(fingerprint)
+    except Exception:
+        # Another ingestion of the same content finished first, keep its source
+        existing = await Source.afind_by_fingerprint(fingerprint)
+        if existing is None:
+            raise
+        await asyncio.to_thread(source.delete)
+        return await _reuse_source(existing, state["notebook_id"])
+    return {}
+
+
 # Create and compile the workflow
 workflow = StateGraph(SourceState)
 
 # Add nodes
+workflow.add_node("find_existing_source", find_existing_source)
 workflow.add_node("content_process", content_process)
+workflow.add_node("find_extracted_source", find_existing_source)
 workflow.add_node("save_source", save_source)
+workflow.add_node("embed_source", embed_source)
 workflow.add_node("transform_content", transform_content)
+workflow.add_node("save_insights", save_insights)
+workflow.add_node("finish_source", finish_source)
 # Define the graph edges
-workflow.add_edge(START, "content_process")
-workflow.add_edge("content_process", "save_source")
+workflow.add_edge(START, "find_existing_source")
+workflow.add_conditional_edges(
+    "find_existing_source", route_new_content, ["content_process", "embed_source"]
+)
 workflow.add_conditional_edges(
-    "save_source", trigger_transformations, ["transform_content"]
+    "content_process",
+    route_extracted_content,
+    ["save_source", "find_extracted_source"],
 )
-workflow.add_edge("transform_content", END)
+workflow.add_conditional_edges(
+    "find_extracted_source", route_extracted_source, ["save_source", "embed_source"]
+)
+workflow.add_edge("save_source", "embed_source")
+workflow.add_conditional_edges(
+    "embed_source", trigger_transformations, ["transform_content", "finish_source"]
+)
+workflow.add_edge("transform_content", "save_insights")
+workflow.add_edge("save_insights", "finish_source")
+workflow.add_edge("finish_source", END)
 
 # Compile the graph
 source_graph = workflow.compile()
 
 
-import os
+async def run_source_graph(
+    state: Dict[str, Any],
+    on_update: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+) -> Tuple[Optional[Source], bool]:
+    """
+    Runs source_graph, calling `on_update` with the name and output of every node
+    as it finishes. Returns the source and whether it was ingested before (see
+    find_existing_source).
+
+    If the run fails, the source it created is removed so that a retry starts over
+    instead of leaving a half ingested copy behind. A reused source is kept.
+    """
+    created: Optional[Source] = None
+    reused: Optional[Source] = None
+    try:
+        async for update in source_graph.astream(state, stream_mode="updates"):
+            for node, output in update.items():
+                output = output or {}
+                if output.get("reused"):
+                    reused = output["source"]
+                elif node == "save_source":
+                    created = output["source"]
+                if on_update:
+                    on_update(node, output)
+    except Exception:
+        if created is not None:
+            logger.warning(f"Removing partially ingested source {created.id}")
+            await asyncio.to_thread(created.delete)
+        raise
+    if reused is not None:
+        return reused, True
+    return created, False
+
+
 import google.generativeai as genai
 
 # Load your Gemini key into both conventions:
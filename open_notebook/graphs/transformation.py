@@ -1,14 +1,30 @@
+import asyncio
+import operator
+from typing import List, Tuple, Union
+
 from ai_prompter import Prompter
+from esperanto import LanguageModel
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, START, StateGraph
-from typing_extensions import TypedDict
+from langgraph.types import Send
+from loguru import logger
+from typing_extensions import Annotated, TypedDict
 import os
 import google.generativeai as genai
+from open_notebook.config import CONFIG
 from open_notebook.domain.notebook import Source
 from open_notebook.domain.transformation import DefaultPrompts, Transformation
-from open_notebook.graphs.utils import provision_langchain_model
-from open_notebook.utils import clean_thinking_content
+from open_notebook.graphs.utils import provider_semaphore, provision_model
+from open_notebook.utils import (
+    clean_thinking_content,
+    exceeds_token_limit,
+    split_text,
+    token_count_many,
+)
+
+
+REDUCE_INSTRUCTIONS = """The input is made of partial results, each one produced by the instructions below from a consecutive part of a longer text. Combine them into the single result those instructions would give for the whole text: merge what the parts have in common, remove repetitions and keep the requested format."""
 
 
 class TransformationState(TypedDict):
@@ -16,16 +32,66 @@ class TransformationState(TypedDict):
     source: Source
     transformation: Transformation
     output: str
+    chunks: List[str]
+    chunk_outputs: Annotated[list, operator.add]
+
+
+class ChunkState(TypedDict):
+    transformation: Transformation
+    chunk: str
+    index: int
+
+
+def map_reduce_chunk_size() -> int:
+    """Tokens per chunk of a map_reduce transformation"""
+    map_reduce_config = (CONFIG.get("language") or {}).get("map_reduce") or {}
+    return map_reduce_config.get("chunk_size", 8000)
+
+
+def map_reduce_reduce_size() -> int:
+    """Tokens of partial results combined by a single reduce call"""
+    map_reduce_config = (CONFIG.get("language") or {}).get("map_reduce") or {}
+    return map_reduce_config.get("reduce_size", 32000)
 
 
-def run_transformation(state: dict, config: RunnableConfig) -> dict:
+def _join_parts(outputs: List[str]) -> str:
+    return "\n\n".join(
+        f"## Part {idx + 1}\n\n{output}" for idx, output in enumerate(outputs)
+    )
+
+
+def _reduce_batches(outputs: List[str], limit: int) -> List[List[str]]:
+    """
+    Groups consecutive outputs up to `limit` tokens. A batch takes at least two
+    outputs, so that every round of reduce calls leaves fewer of them.
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    tokens = 0
+    for output, count in zip(outputs, token_count_many(outputs)):
+        if len(batch) >= 2 and tokens + count > limit:
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(output)
+        tokens += count
+    if len(batch) == 1 and batches:
+        batches[-1].append(batch[0])
+    elif batch:
+        batches.append(batch)
+    return batches
+
+
+def _input_text(state: dict) -> str:
     source: Source = state.get("source")
     content = state.get("input_text")
     assert source or content, "No content to transform"
-    transformation: Transformation = state["transformation"]
-    if not content:
-        content = source.full_text
-    transformation_template_text = transformation.prompt
+    return content or source.full_text
+
+
+def _prepare(
+    state: dict, config: RunnableConfig, instructions: str, content: str
+) -> Tuple[list, LanguageModel]:
+    transformation_template_text = instructions
     default_prompts: DefaultPrompts = DefaultPrompts()
     if default_prompts.transformation_instructions:
         transformation_template_text = f"{default_prompts.transformation_instructions}\n\n{transformation_template_text}"
@@ -36,29 +102,116 @@ def run_transformation(state: dict, config: RunnableConfig) -> dict:
         data=state
     )
     payload = [SystemMessage(content=system_prompt)] + [HumanMessage(content=content)]
-    chain = provision_langchain_model(
+    model = provision_model(
         str(payload),
         config.get("configurable", {}).get("model_id"),
         "transformation",
         max_tokens=5000,
     )
+    return payload, model
+
+
+async def _run_prompt(
+    state: dict, config: RunnableConfig, instructions: str, content: str
+) -> str:
+    # Loading the settings and the model may hit the database
+    payload, model = await asyncio.to_thread(
+        _prepare, state, config, instructions, content
+    )
+    async with provider_semaphore(model.provider):
+        response = await model.to_langchain().ainvoke(payload)
 
-    response = chain.invoke(payload)
-    
     # Clean thinking content from the response
-    cleaned_content = clean_thinking_content(response.content)
-    
-    if source:
-        source.add_insight(transformation.title, cleaned_content)
+    return clean_thinking_content(response.content)
+
+
+async def run_transformation(state: dict, config: RunnableConfig) -> dict:
+    """
+    Runs the transformation prompt on the input. Storing the output as an insight is
+    left to the caller, so that the insights of a source are written together.
+    """
+    content = await asyncio.to_thread(_input_text, state)
+    transformation: Transformation = state["transformation"]
+    return {
+        "output": await _run_prompt(state, config, transformation.prompt, content),
+    }
+
+
+def route_mode(state: dict) -> str:
+    if state["transformation"].mode == "map_reduce":
+        return "split_input"
+    return "agent"
+
+
+async def split_input(state: dict) -> dict:
+    content = await asyncio.to_thread(_input_text, state)
+    chunks = await asyncio.to_thread(split_text, content, map_reduce_chunk_size())
+    return {"input_text": content, "chunks": chunks}
 
+
+def trigger_map(state: dict) -> Union[str, List[Send]]:
+    if len(state["chunks"]) <= 1:
+        # Short enough for a single call
+        return "agent"
+    logger.debug(
+        f"Applying {state['transformation'].name} to {len(state['chunks'])} chunks"
+    )
+    return [
+        Send(
+            "map_chunk",
+            {"transformation": state["transformation"], "chunk": chunk, "index": idx},
+        )
+        for idx, chunk in enumerate(state["chunks"])
+    ]
+
+
+async def map_chunk(state: ChunkState, config: RunnableConfig) -> dict:
+    output = await _run_prompt(
+        dict(state), config, state["transformation"].prompt, state["chunk"]
+    )
+    return {"chunk_outputs": [(state["index"], output)]}
+
+
+async def reduce_outputs(state: dict, config: RunnableConfig) -> dict:
+    transformation: Transformation = state["transformation"]
+    outputs = [
+        output for _, output in sorted(state["chunk_outputs"], key=lambda item: item[0])
+    ]
+    instructions = (
+        f"{transformation.reduce_prompt or REDUCE_INSTRUCTIONS}\n\n"
+        f"# INSTRUCTIONS\n\n{transformation.prompt}"
+    )
+    limit = map_reduce_reduce_size()
+    # Too many partial results for one call, combine them in rounds
+    while len(outputs) > 1 and await asyncio.to_thread(
+        exceeds_token_limit, _join_parts(outputs), limit
+    ):
+        batches = await asyncio.to_thread(_reduce_batches, outputs, limit)
+        logger.debug(
+            f"Reducing {len(outputs)} partial results of {transformation.name} in {len(batches)} batches"
+        )
+        outputs = list(
+            await asyncio.gather(
+                *(
+                    _run_prompt(state, config, instructions, _join_parts(batch))
+                    for batch in batches
+                )
+            )
+        )
     return {
-        "output": cleaned_content,
+        "output": await _run_prompt(state, config, instructions, _join_parts(outputs)),
     }
 
 
 agent_state = StateGraph(TransformationState)
 agent_state.add_node("agent", run_transformation)
-agent_state.add_edge(START, "agent")
+agent_state.add_node("split_input", split_input)
+agent_state.add_node("map_chunk", map_chunk)
+agent_state.add_node("reduce_outputs", reduce_outputs)
+agent_state.add_conditional_edges(START, route_mode, ["agent", "split_input"])
+agent_state.add_conditional_edges("split_input", trigger_map, ["agent", "map_chunk"])
+agent_state.add_edge("map_chunk", "reduce_outputs")
+agent_state.add_edge("reduce_outputs", END)
 agent_state.add_edge("agent", END)
 graph = agent_state.compile()
 
@@ -1,26 +1,57 @@
+import asyncio
+import threading
+from typing import Dict
+from weakref import WeakKeyDictionary
+
 from esperanto import LanguageModel
 from langchain_core.language_models.chat_models import BaseChatModel
 from loguru import logger
 import os
 import google.generativeai as genai
+from open_notebook.config import CONFIG
 from open_notebook.domain.models import model_manager
-from open_notebook.utils import token_count
+from open_notebook.utils import estimate_token_count, exceeds_token_limit
 
+# asyncio semaphores belong to an event loop, so there is a set per loop
+_provider_semaphores: WeakKeyDictionary = WeakKeyDictionary()
+_semaphores_lock = threading.Lock()
 
-def provision_langchain_model(
-    content, model_id, default_type, **kwargs
-) -> BaseChatModel:
+
+def provider_max_concurrency(provider: str) -> int:
+    """
+    Concurrent calls allowed to a language model provider, from the `language`
+    section of open_notebook_config.yaml.
+    """
+    language_config = CONFIG.get("language") or {}
+    limits = {"max_concurrency": 4}
+    limits.update(language_config.get("default") or {})
+    limits.update((language_config.get("providers") or {}).get(provider) or {})
+    return max(1, int(limits["max_concurrency"]))
+
+
+def provider_semaphore(provider: str) -> asyncio.Semaphore:
+    """Caps the concurrent calls to `provider` made from the running event loop"""
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        semaphores: Dict[str, asyncio.Semaphore] = _provider_semaphores.setdefault(
+            loop, {}
+        )
+        if provider not in semaphores:
+            semaphores[provider] = asyncio.Semaphore(provider_max_concurrency(provider))
+        return semaphores[provider]
+
+
+def provision_model(content, model_id, default_type, **kwargs) -> LanguageModel:
     """
     Returns the best model to use based on the context size and on whether there is a specific model being requested in Config.
     If context > 105_000, returns the large_context_model
     If model_id is specified in Config, returns that model
     Otherwise, returns the default model for the given type
     """
-    tokens = token_count(content)
-
-    if tokens > 105_000:
+    # The exact token count only matters close to the threshold
+    if exceeds_token_limit(content, 105_000):
         logger.debug(
-            f"Using large context model because the content has {tokens} tokens"
+            f"Using large context model because the content has about {estimate_token_count(content)} tokens"
         )
         model = model_manager.get_default_model("large_context", **kwargs)
     elif model_id:
@@ -30,7 +61,14 @@ def provision_langchain_model(
 
     logger.debug(f"Using model: {model}")
     assert isinstance(model, LanguageModel), f"Model is not a LanguageModel: {model}"
-    return model.to_langchain()
+    return model
+
+
+def provision_langchain_model(
+    content, model_id, default_type, **kwargs
+) -> BaseChatModel:
+    """Same as provision_model, as a LangChain chat model"""
+    return provision_model(content, model_id, default_type, **kwargs).to_langchain()
 
 import os
 import google.generativeai as genai
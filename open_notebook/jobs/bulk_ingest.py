@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional, Sequence
+
+from content_core import extract_content
+from content_core.common import ProcessSourceState
+from loguru import logger
+
+from open_notebook.domain.content_settings import ContentSettings
+from open_notebook.domain.notebook import Source
+from open_notebook.domain.transformation import Transformation
+from open_notebook.graphs.source import extraction_options, run_source_graph
+from open_notebook.jobs.handlers import generate_quiz
+from open_notebook.jobs.queue import DONE, FAILED
+from open_notebook.utils import content_fingerprint
+
+STATE_FILE_NAME = ".open_notebook_ingest.json"
+
+
+def extract_file(content_state: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs extract_content in a pool process, returns the processed state as a dict"""
+    processed = asyncio.run(extract_content(content_state))
+    return processed.model_dump()
+
+
+def item_key(item: Dict[str, Any]) -> str:
+    """Identifies an item in the state file"""
+    if item.get("url") or item.get("file_path"):
+        return item.get("url") or item["file_path"]
+    return "content:" + hashlib.sha256(item["content"].encode()).hexdigest()
+
+
+def _manifest_item(entry: Any, base_dir: str) -> Dict[str, Any]:
+    if isinstance(entry, str):
+        entry = (
+            {"url": entry}
+            if entry.startswith(("http://", "https://"))
+            else {"file_path": entry}
+        )
+    item = dict(entry)
+    if not (item.get("url") or item.get("file_path") or item.get("content")):
+        raise ValueError(f"Manifest entry needs a url, file_path or content: {entry}")
+    if item.get("file_path"):
+        item["file_path"] = os.path.abspath(os.path.join(base_dir, item["file_path"]))
+    return item
+
+
+def read_manifest(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads the items to ingest from a manifest: a JSON list or JSON lines of urls,
+    paths or objects with url, file_path or content and an optional title, or a text
+    file with a url or path per line. Paths are relative to the manifest.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            entries = json.load(f)
+        elif path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = [
+                line.strip()
+                for line in f
+                if line.strip() and not line.lstrip().startswith("#")
+            ]
+    return [_manifest_item(entry, base_dir) for entry in entries]
+
+
+def scan_directory(path: str, pattern: str = "*") -> List[Dict[str, Any]]:
+    """Every file under `path` matching `pattern`, skipping hidden files and folders"""
+    items = []
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if not name.startswith(".") and fnmatch(name, pattern):
+                items.append({"file_path": os.path.abspath(os.path.join(root, name))})
+    return items
+
+
+class IngestState:
+    """
+    Outcome of every item of a bulk ingest, written after each item so that running
+    the same ingest again skips what is done and retries what failed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.items: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.items = json.load(f)
+
+    def done(self, key: str) -> bool:
+        return self.items.get(key, {}).get("status") == DONE
+
+    def record(self, key: str, **entry: Any) -> None:
+        self.items[key] = dict(entry, updated=time.time())
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.items, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+async def abulk_ingest(
+    items: Sequence[Dict[str, Any]],
+    notebook_id: Optional[str] = None,
+    transformations: Sequence[Transformation] = (),
+    embed: bool = False,
+    quiz: bool = False,
+    processes: Optional[int] = None,
+    concurrency: int = 4,
+    state: Optional[IngestState] = None,
+    executor: Optional[Executor] = None,
+) -> Dict[str, int]:
+    """
+    Runs source_graph over many items. Content is extracted by a pool of `processes`
+    processes, the rest of the graph runs for `concurrency` items at a time in this
+    process, so that their chunks go through the shared embedder together. Files and
+    text ingested before are reused without extracting them again.
+    Returns how many items were done, failed or skipped (done in a previous run).
+    """
+    pending = [item for item in items if not (state and state.done(item_key(item)))]
+    counts = {DONE: 0, FAILED: 0, "skipped": len(items) - len(pending)}
+    if counts["skipped"]:
+        logger.info(f"Skipping {counts['skipped']} items ingested by a previous run")
+    if not pending:
+        return counts
+
+    processes = processes or os.cpu_count() or 1
+    options = extraction_options()
+    loop = asyncio.get_running_loop()
+    # Bounds the extracted content held in memory while items wait for the pipeline
+    in_flight = asyncio.Semaphore(processes + concurrency)
+    pipeline = asyncio.Semaphore(concurrency)
+
+    def finished(key: str, **entry: Any) -> str:
+        counts[entry["status"]] += 1
+        if state is not None:
+            state.record(key, **entry)
+        return f"[{counts[DONE] + counts[FAILED]}/{len(pending)}]"
+
+    async def ingest(item: Dict[str, Any], pool: Executor) -> None:
+        key = item_key(item)
+        async with in_flight:
+            started = time.monotonic()
+            try:
+                # Files and text are identified before extraction (urls only by
+                # what is fetched from them), content ingested before isn't
+                # extracted again
+                fingerprint = None
+                if not item.get("url"):
+                    fingerprint = await asyncio.to_thread(
+                        content_fingerprint,
+                        file_path=item.get("file_path"),
+                        content=item.get("content"),
+                    )
+                content_state: Any = dict(item)
+                if not (
+                    fingerprint and await Source.afind_by_fingerprint(fingerprint)
+                ):
+                    extracted = await loop.run_in_executor(
+                        pool, extract_file, {**item, **options}
+                    )
+                    if item.get("title"):
+                        extracted["title"] = item["title"]
+                    content_state = ProcessSourceState(**extracted)
+                async with pipeline:
+                    source, reused = await run_source_graph(
+                        {
+                            "content_state": content_state,
+                            "notebook_id": notebook_id,
+                            "apply_transformations": list(transformations),
+                            "embed": embed,
+                            "fingerprint": fingerprint,
+                        }
+                    )
+            except Exception as e:
+                progress = finished(
+                    key, status=FAILED, error=f"{type(e).__name__}: {e}"
+                )
+                logger.error(f"{progress} Failed to ingest {key}: {e}")
+                return
+
+            entry: Dict[str, Any] = {"status": DONE, "source_id": source.id}
+            if reused:
+                entry["reused"] = True
+            elif quiz:
+                try:
+                    entry["quiz_questions"] = await asyncio.to_thread(
+                        generate_quiz, source, notebook_id
+                    )
+                except Exception as e:
+                    # The source itself is fine, don't ingest it again for this
+                    logger.error(f"Quiz generation failed for {source.id}: {e}")
+                    entry["quiz_error"] = str(e)
+            progress = finished(key, **entry)
+            logger.info(
+                f"{progress} Ingested {key} as {source.id} in {time.monotonic() - started:.1f}s"
+            )
+
+    pool = executor or ProcessPoolExecutor(max_workers=processes)
+    try:
+        async with asyncio.TaskGroup() as tasks:
+            for item in pending:
+                tasks.create_task(ingest(item, pool))
+    finally:
+        if executor is None:
+            pool.shutdown(cancel_futures=True)
+    return counts
+
+
+def bulk_ingest(items: Sequence[Dict[str, Any]], **kwargs: Any) -> Dict[str, int]:
+    return asyncio.run(abulk_ingest(items, **kwargs))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Ingests every file of a folder, or every entry of a manifest"
+    )
+    parser.add_argument("path", help="Folder or manifest (.json, .jsonl or .txt)")
+    parser.add_argument("--notebook", help="Notebook id to add the sources to")
+    parser.add_argument(
+        "--pattern", default="*", help="Only ingest the folder files matching this"
+    )
+    parser.add_argument(
+        "--transformation",
+        action="append",
+        dest="transformations",
+        default=[],
+        help="Transformation id to apply, the default transformations when omitted",
+    )
+    parser.add_argument(
+        "--no-transformations",
+        action="store_true",
+        help="Don't apply the default transformations",
+    )
+    parser.add_argument(
+        "--embed",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Embed for vector search, per the content settings when omitted",
+    )
+    parser.add_argument(
+        "--quiz", action="store_true", help="Generate quiz questions for every source"
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count(),
+        help="Content extraction processes",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Sources saved, embedded and transformed at a time",
+    )
+    parser.add_argument(
+        "--state",
+        help=f"Progress file used to resume, defaults to {STATE_FILE_NAME} next to the input",
+    )
+    args = parser.parse_args()
+
+    if os.path.isdir(args.path):
+        items = scan_directory(args.path, args.pattern)
+        state_path = args.state or os.path.join(args.path, STATE_FILE_NAME)
+    else:
+        items = read_manifest(args.path)
+        state_path = args.state or os.path.join(
+            os.path.dirname(os.path.abspath(args.path)), STATE_FILE_NAME
+        )
+
+    if args.transformations:
+        transformations = [Transformation.get(t) for t in args.transformations]
+    elif args.no_transformations:
+        transformations = []
+    else:
+        transformations = [t for t in Transformation.get_all() if t.apply_default]
+    embed = args.embed
+    if embed is None:
+        embed = ContentSettings().default_embedding_option == "always"
+
+    logger.info(
+        f"Ingesting {len(items)} items with {args.processes} extraction processes"
+    )
+    counts = bulk_ingest(
+        items,
+        notebook_id=args.notebook,
+        transformations=transformations,
+        embed=embed,
+        quiz=args.quiz,
+        processes=args.processes,
+        concurrency=args.concurrency,
+        state=IngestState(state_path),
+    )
+    logger.info(
+        f"{counts[DONE]} ingested, {counts[FAILED]} failed, {counts['skipped']} skipped. "
+        f"Progress saved to {state_path}, run again to retry the failed items"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+from open_notebook.domain.identity_map import unit_of_work
+from open_notebook.domain.notebook import Source
+from open_notebook.domain.quiz import (
+    embed_and_store_question,
+    generate_questions_from_text,
+    save_question_record,
+)
+from open_notebook.domain.transformation import Transformation
+from open_notebook.graphs.source import run_source_graph
+from open_notebook.jobs.queue import JobContext
+
+JobHandler = Callable[[Dict[str, Any], JobContext], Optional[Dict[str, Any]]]
+
+HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Registers the function that runs the jobs of `kind`"""
+
+    def register(handler: JobHandler) -> JobHandler:
+        HANDLERS[kind] = handler
+        return handler
+
+    return register
+
+
+def generate_quiz(source: Source, notebook_id: Optional[str], num_questions=5) -> int:
+    """Generates quiz questions from the source text and stores them"""
+    if not source.full_text:
+        return 0
+    questions = generate_questions_from_text(
+        source.full_text,
+        num_questions=num_questions,
+        model_id="gemini-2.0-flash-001",
+    )
+    for q in questions:
+        res = save_question_record(q, notebook_id=notebook_id)
+        created_id = None
+        if (
+            isinstance(res, list)
+            and len(res) > 0
+            and "result" in res[0]
+            and res[0]["result"]
+        ):
+            created_id = res[0]["result"][0].get("id")
+        if created_id:
+            embed_and_store_question(created_id, q["question_text"])
+    return len(questions)
+
+
+@job_handler("ingest_source")
+def ingest_source(
+    payload: Dict[str, Any], context: JobContext
+) -> Optional[Dict[str, Any]]:
+    """
+    Runs source_graph for a new source, then generates its quiz questions.
+
+    Payload: content_state (url, file_path or content), notebook_id, transformations
+    (ids), embed and generate_quiz.
+    """
+    transformations = [
+        Transformation.get(transformation_id)
+        for transformation_id in payload.get("transformations") or []
+    ]
+    applied = 0
+    # A reused source only gets the transformations it doesn't have yet
+    pending = len(transformations)
+
+    def on_update(node: str, output: Dict[str, Any]) -> None:
+        nonlocal applied, pending
+        if "apply_transformations" in output:
+            pending = len(output["apply_transformations"])
+        if node == "content_process":
+            context.progress(0.3, "Saving the source")
+        elif node == "save_source":
+            context.progress(0.4, "Embedding the source")
+        elif node == "embed_source":
+            context.progress(0.6, "Applying transformations")
+        elif node == "transform_content":
+            applied += 1
+            context.progress(
+                0.6 + 0.3 * applied / pending,
+                f"Applied {applied} of {pending} transformations",
+            )
+
+    context.progress(0.05, "Extracting content")
+    with unit_of_work():
+        source, reused = asyncio.run(
+            run_source_graph(
+                {
+                    "content_state": payload["content_state"],
+                    "notebook_id": payload.get("notebook_id"),
+                    "apply_transformations": transformations,
+                    "embed": payload.get("embed", False),
+                },
+                on_update,
+            )
+        )
+
+    if source is None:
+        return None
+    result: Dict[str, Any] = {"source_id": source.id, "title": source.title}
+    if reused:
+        result["reused"] = True
+    elif payload.get("generate_quiz"):
+        context.progress(0.9, "Generating quiz questions")
+        try:
+            result["quiz_questions"] = generate_quiz(source, payload.get("notebook_id"))
+        except Exception as e:
+            # The source itself is fine, don't retry the whole ingestion for this
+            logger.error(f"Quiz generation failed for {source.id}: {e}")
+            result["quiz_error"] = str(e)
+    return result
@@ -0,0 +1,370 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+from loguru import logger
+
+from open_notebook.config import CONFIG, JOBS_FILE
+from open_notebook.exceptions import JobLeaseLostError
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: Dict[str, Any]
+    status: str
+    tag: Optional[str]
+    attempts: int
+    max_attempts: int
+    progress: float
+    message: Optional[str]
+    result: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created: float
+    updated: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Job":
+        return cls(
+            id=row["id"],
+            kind=row["kind"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            tag=row["tag"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            progress=row["progress"],
+            message=row["message"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            error=row["error"],
+            created=row["created"],
+            updated=row["updated"],
+        )
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite file shared by the web app and the workers.
+
+    A worker claims a job with a lease of `lease_seconds` and must renew it (see
+    heartbeat and set_progress) while the job runs. Jobs whose lease expired, because
+    the worker died, are claimed again. Failed jobs are retried with exponential
+    backoff until they used `max_attempts` attempts.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = 60.0,
+        retry_delay: float = 5.0,
+        retention_seconds: float = 86_400.0,
+        failed_retention_seconds: float = 604_800.0,
+    ):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.retry_delay = retry_delay
+        self.retention_seconds = retention_seconds
+        self.failed_retention_seconds = failed_retention_seconds
+        self._local = threading.local()
+        self._pid = os.getpid()
+        with self._transaction() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    tag TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    run_after REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+                """
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_tag ON jobs (tag, created)")
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (status, updated)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, SQLite serializes writers across processes
+        if self._pid != os.getpid():
+            # Forked, the connections of the parent must not be used here
+            self._local = threading.local()
+            self._pid = os.getpid()
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._connection()
+        # Takes the write lock upfront, so two workers can't claim the same job
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def submit(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        tag: Optional[str] = None,
+        max_attempts: int = 3,
+    ) -> str:
+        """Queues a job and returns its id. `tag` groups jobs, eg. by notebook"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                """
+                INSERT INTO jobs (id, kind, payload, status, tag, max_attempts,
+                                  run_after, created, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    job_id,
+                    kind,
+                    json.dumps(payload),
+                    QUEUED,
+                    tag,
+                    max_attempts,
+                    now,
+                    now,
+                    now,
+                ),
+            )
+        logger.debug(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def claim(
+        self, worker_id: str, kinds: Optional[Sequence[str]] = None
+    ) -> Optional[Job]:
+        """Leases the oldest runnable job to `worker_id`, if there is one"""
+        now = time.time()
+        kind_filter = ""
+        params: List[Any] = [QUEUED, now, RUNNING, now]
+        if kinds:
+            kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+        with self._transaction() as db:
+            while True:
+                row = db.execute(
+                    f"""
+                    SELECT * FROM jobs
+                    WHERE ((status = ? AND run_after <= ?) OR (status = ? AND lease_expires < ?))
+                    {kind_filter}
+                    ORDER BY created LIMIT 1
+                    """,
+                    params,
+                ).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= row["max_attempts"]:
+                    # Its last worker died while running it
+                    db.execute(
+                        "UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, updated = ? WHERE id = ?",
+                        (FAILED, row["error"] or "Worker lost", now, row["id"]),
+                    )
+                    continue
+                db.execute(
+                    """
+                    UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?,
+                                    lease_expires = ?, updated = ?
+                    WHERE id = ?
+                    """,
+                    (RUNNING, worker_id, now + self.lease_seconds, now, row["id"]),
+                )
+                return self.get(row["id"])
+
+    def _update_leased(
+        self, job_id: str, worker_id: str, sql: str, params: Sequence[Any]
+    ) -> bool:
+        with self._transaction() as db:
+            cursor = db.execute(
+                f"UPDATE jobs SET {sql}, updated = ? WHERE id = ? AND lease_owner = ? AND status = ?",
+                (*params, time.time(), job_id, worker_id, RUNNING),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Renews the lease, returns False if the job is no longer leased to the worker"""
+        return self._update_leased(
+            job_id, worker_id, "lease_expires = ?", (time.time() + self.lease_seconds,)
+        )
+
+    def set_progress(
+        self,
+        job_id: str,
+        worker_id: str,
+        progress: float,
+        message: Optional[str] = None,
+    ) -> bool:
+        return self._update_leased(
+            job_id,
+            worker_id,
+            "progress = ?, message = ?, lease_expires = ?",
+            (min(max(progress, 0.0), 1.0), message, time.time() + self.lease_seconds),
+        )
+
+    def complete(
+        self, job_id: str, worker_id: str, result: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        return self._update_leased(
+            job_id,
+            worker_id,
+            "status = ?, progress = 1, result = ?, error = NULL, lease_owner = NULL",
+            (DONE, json.dumps(result) if result is not None else None),
+        )
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> bool:
+        """Records a failed attempt, the job is queued again unless it was the last one"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        if job.attempts < job.max_attempts:
+            delay = self.retry_delay * 2 ** (job.attempts - 1)
+            logger.warning(f"Job {job_id} failed, retrying in {delay:.0f}s: {error}")
+            return self._update_leased(
+                job_id,
+                worker_id,
+                "status = ?, error = ?, run_after = ?, lease_owner = NULL",
+                (QUEUED, error, time.time() + delay),
+            )
+        logger.error(f"Job {job_id} failed after {job.attempts} attempts: {error}")
+        return self._update_leased(
+            job_id,
+            worker_id,
+            "status = ?, error = ?, lease_owner = NULL",
+            (FAILED, error),
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = (
+            self._connection()
+            .execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            .fetchone()
+        )
+        return Job.from_row(row) if row else None
+
+    def list(
+        self,
+        tag: Optional[str] = None,
+        statuses: Optional[Sequence[str]] = None,
+        limit: int = 50,
+        updated_since: Optional[float] = None,
+    ) -> List[Job]:
+        """Most recent jobs first"""
+        conditions: List[str] = []
+        params: List[Any] = []
+        if tag is not None:
+            conditions.append("tag = ?")
+            params.append(tag)
+        if statuses:
+            conditions.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if updated_since is not None:
+            conditions.append("updated >= ?")
+            params.append(updated_since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = (
+            self._connection()
+            .execute(
+                f"SELECT * FROM jobs {where} ORDER BY created DESC LIMIT ?",
+                (*params, limit),
+            )
+            .fetchall()
+        )
+        return [Job.from_row(row) for row in rows]
+
+    def dismiss(self, job_id: str) -> None:
+        """Deletes a finished job"""
+        with self._transaction() as db:
+            db.execute(
+                "DELETE FROM jobs WHERE id = ? AND status IN (?, ?)",
+                (job_id, DONE, FAILED),
+            )
+
+    def purge(self) -> int:
+        """
+        Deletes the jobs done more than `retention_seconds` ago and the jobs that
+        failed more than `failed_retention_seconds` ago, returns how many
+        """
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "DELETE FROM jobs WHERE (status = ? AND updated < ?) OR (status = ? AND updated < ?)",
+                (
+                    DONE,
+                    now - self.retention_seconds,
+                    FAILED,
+                    now - self.failed_retention_seconds,
+                ),
+            )
+        if cursor.rowcount:
+            logger.info(f"Purged {cursor.rowcount} finished jobs")
+        return cursor.rowcount
+
+
+class JobContext:
+    """Handed to job handlers to report progress on the job they run"""
+
+    def __init__(self, queue: JobQueue, job: Job, worker_id: str):
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+
+    def progress(self, progress: float, message: Optional[str] = None) -> None:
+        logger.debug(f"Job {self.job.id}: {progress:.0%} {message or ''}")
+        if not self.queue.set_progress(self.job.id, self.worker_id, progress, message):
+            # Reclaimed by another worker, stop before doing the work twice
+            raise JobLeaseLostError(f"Job {self.job.id} is no longer leased to us")
+
+
+def _build_job_queue() -> JobQueue:
+    jobs_config = CONFIG.get("jobs") or {}
+    return JobQueue(
+        JOBS_FILE,
+        lease_seconds=jobs_config.get("lease_seconds", 60),
+        retry_delay=jobs_config.get("retry_delay_seconds", 5),
+        retention_seconds=jobs_config.get("retention_hours", 24) * 3600,
+        failed_retention_seconds=jobs_config.get("failed_retention_hours", 168) * 3600,
+    )
+
+
+job_queue = _build_job_queue()
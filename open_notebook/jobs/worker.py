@@ -0,0 +1,156 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+from typing import List, Optional, Sequence
+
+from loguru import logger
+
+from open_notebook.config import CONFIG
+from open_notebook.domain.embedding import build_vector_indexes
+from open_notebook.domain.live_invalidation import start_live_invalidation
+from open_notebook.domain.vector_index import maintain_vector_index
+from open_notebook.exceptions import JobLeaseLostError
+from open_notebook.jobs.handlers import HANDLERS
+from open_notebook.jobs.queue import Job, JobContext, JobQueue, job_queue
+
+
+class Worker:
+    """Claims jobs from the queue and runs them, one at a time"""
+
+    def __init__(
+        self,
+        queue: JobQueue = job_queue,
+        kinds: Optional[Sequence[str]] = None,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.kinds = list(kinds or HANDLERS)
+        self.poll_interval = poll_interval
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stopped = threading.Event()
+
+    def _heartbeat(self, job: Job, done: threading.Event) -> None:
+        # Keeps the lease while a step runs longer than the lease without progress
+        while not done.wait(self.queue.lease_seconds / 3):
+            if not self.queue.heartbeat(job.id, self.id):
+                return
+
+    def run_once(self) -> bool:
+        """Runs the next job, returns False when there was none"""
+        job = self.queue.claim(self.id, self.kinds)
+        if job is None:
+            return False
+        logger.info(f"Running {job.kind} job {job.id} (attempt {job.attempts})")
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job, done), daemon=True).start()
+        try:
+            result = HANDLERS[job.kind](
+                job.payload, JobContext(self.queue, job, self.id)
+            )
+            self.queue.complete(job.id, self.id, result)
+            logger.info(f"Finished {job.kind} job {job.id}")
+        except JobLeaseLostError as e:
+            logger.warning(str(e))
+        except Exception as e:
+            logger.exception(e)
+            self.queue.fail(job.id, self.id, f"{type(e).__name__}: {e}")
+        finally:
+            done.set()
+        return True
+
+    def _purge(self) -> None:
+        try:
+            self.queue.purge()
+        except Exception as e:
+            logger.error(f"Purging finished jobs failed: {e}")
+
+    def _maintain(self) -> None:
+        # Upkeep too slow for the request path, workers do it between jobs
+        self._purge()
+        try:
+            maintain_vector_index()
+        except Exception as e:
+            logger.error(f"Vector index maintenance failed: {e}")
+
+    def run(self) -> None:
+        logger.info(f"Worker {self.id} waiting for {', '.join(self.kinds)} jobs")
+        self._purge()
+        interval = (CONFIG.get("vector_search") or {}).get("maintenance_seconds", 600)
+        maintained = 0.0
+        while not self._stopped.is_set():
+            if self.run_once():
+                continue
+            if time.monotonic() - maintained >= interval:
+                self._maintain()
+                maintained = time.monotonic()
+            self._stopped.wait(self.poll_interval)
+
+    def stop(self) -> None:
+        """Stops after the current job"""
+        self._stopped.set()
+
+
+_embedded_workers: List[Worker] = []
+_embedded_lock = threading.Lock()
+
+
+def start_embedded_workers() -> List[Worker]:
+    """
+    Runs `jobs.embedded_workers` workers on threads of the current process, once.
+    Off by default, lets a single process setup work without a worker process.
+    """
+    count = (CONFIG.get("jobs") or {}).get("embedded_workers", 0)
+    with _embedded_lock:
+        while len(_embedded_workers) < count:
+            worker = Worker()
+            threading.Thread(
+                target=worker.run, name=f"job-worker-{worker.id}", daemon=True
+            ).start()
+            _embedded_workers.append(worker)
+    return _embedded_workers
+
+
+def _run_worker(kinds: Optional[Sequence[str]]) -> None:
+    # Caches of the worker follow writes made by the app and other workers
+    start_live_invalidation()
+    build_vector_indexes()
+    worker = Worker(kinds=kinds)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    worker.run()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Runs background jobs")
+    parser.add_argument(
+        "--processes", type=int, default=1, help="Worker processes to start"
+    )
+    parser.add_argument(
+        "--kind", action="append", dest="kinds", help="Only run jobs of this kind"
+    )
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _run_worker(args.kinds)
+        return
+    # Spawned rather than forked, so that every worker opens its own SQLite and
+    # SurrealDB connections instead of sharing the ones of this process
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_run_worker, args=(args.kinds,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, lambda *_: [p.terminate() for p in processes])
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
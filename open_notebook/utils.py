@@ -1,21 +1,31 @@
+import hashlib
+import math
 import os
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse, urlunparse
+
 import google.generativeai as genai
+import requests
+import tomli
+from packaging.version import parse as parse_version
 
 # Load your Gemini key into both conventions:
 gemini_key = os.getenv("GEMINI_API_KEY")
 os.environ["GOOGLE_API_KEY"] = gemini_key  # langchain_google_genai expects this
 genai.api_key = gemini_key
 
-import re
-import unicodedata
-from importlib.metadata import PackageNotFoundError, version
-from typing import Tuple
-from urllib.parse import urlparse
 
-import requests
-import tomli
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from packaging.version import parse as parse_version
+@lru_cache(maxsize=1)
+def get_token_encoding():
+    """The 'o200k_base' encoding, loaded once per process"""
+    import tiktoken
+
+    return tiktoken.get_encoding("o200k_base")
 
 
 def token_count(input_string) -> int:
@@ -28,14 +38,61 @@ def token_count(input_string) -> int:
     Returns:
         int: The number of tokens in the input string.
     """
-    import tiktoken
-
-    encoding = tiktoken.get_encoding("o200k_base")
-    tokens = encoding.encode(input_string)
+    tokens = get_token_encoding().encode(input_string)
     token_count = len(tokens)
     return token_count
 
 
+def token_count_many(input_strings: Iterable[str]) -> List[int]:
+    """
+    Count the tokens of many strings at once, encoding them in parallel.
+
+    Args:
+        input_strings (Iterable[str]): The strings to count tokens for.
+
+    Returns:
+        List[int]: The number of tokens of each string, in the same order.
+    """
+    return [
+        len(tokens) for tokens in get_token_encoding().encode_batch(list(input_strings))
+    ]
+
+
+def estimate_token_count(input_string: str, chars_per_token: float = 4.0) -> int:
+    """
+    Estimate the number of tokens from the length of the string, for when an exact
+    count is not worth its cost. About right for English text, low for CJK text.
+
+    Args:
+        input_string (str): The input string to estimate tokens for.
+        chars_per_token (float): Average characters per token. Default is 4.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return math.ceil(len(input_string) / chars_per_token)
+
+
+def exceeds_token_limit(input_string: str, limit: int) -> bool:
+    """
+    Check whether the string has more than `limit` tokens. Tokens are only counted
+    when the length of the string can't settle it.
+
+    Args:
+        input_string (str): The input string to check.
+        limit (int): The maximum number of tokens.
+
+    Returns:
+        bool: True if the string has more than `limit` tokens.
+    """
+    # Every token is at least one byte
+    if len(input_string) * 4 <= limit or len(input_string.encode("utf-8")) <= limit:
+        return False
+    if estimate_token_count(input_string) > 2 * limit:
+        return True
+    return token_count(input_string) > limit
+
+
 def token_cost(token_count, cost_per_million=0.150) -> float:
     """
     Calculate the cost of tokens based on the token count and cost per million tokens.
@@ -50,39 +107,111 @@ def token_cost(token_count, cost_per_million=0.150) -> float:
     return cost_per_million * (token_count / 1_000_000)
 
 
+# Chunk boundaries are placed on the first of these found, in order
+TEXT_SEPARATORS = [
+    "\n\n",
+    "\n",
+    ".",
+    ",",
+    " ",
+    "\u200b",  # Zero-width space
+    "\uff0c",  # Fullwidth comma
+    "\u3001",  # Ideographic comma
+    "\uff0e",  # Fullwidth full stop
+    "\u3002",  # Ideographic full stop
+    "",
+]
+
+
+def _last_separator(
+    text: str, start: int, end: int, separators: Sequence[str]
+) -> Tuple[int, str]:
+    # Position of the last occurrence of the highest priority separator in
+    # text[start + 1:end], the separator is kept at the start of the next chunk
+    for separator in separators:
+        if not separator:
+            return end, separator
+        position = text.rfind(separator, start + 1, end)
+        if position != -1:
+            return position, separator
+    return end, ""
+
+
+def chunk_text(
+    txt: str,
+    chunk_size: int = 500,
+    overlap: Optional[int] = None,
+    separators: Sequence[str] = TEXT_SEPARATORS,
+) -> Iterator[str]:
+    """
+    Split the input text into chunks of at most `chunk_size` tokens, lazily.
+
+    The text is tokenized once. Each chunk ends before the last occurrence of the
+    highest priority separator that fits, and the next chunk starts about `overlap`
+    tokens earlier, on the same separator, so that chunks overlap.
+
+    Args:
+        txt (str): The input text to be split.
+        chunk_size (int): The maximum number of tokens of a chunk. Default is 500.
+        overlap (int): Tokens shared by consecutive chunks. Default is 15% of chunk_size.
+        separators (Sequence[str]): Separators to split on, by priority.
+
+    Yields:
+        str: The text chunks, stripped of surrounding whitespace.
+    """
+    if overlap is None:
+        overlap = int(chunk_size * 0.15)
+    encoding = get_token_encoding()
+    tokens = encoding.encode(txt)
+    if not tokens:
+        return
+    # Character offset where each token starts
+    txt, offsets = encoding.decode_with_offsets(tokens)
+    total = len(tokens)
+
+    start_token, start = 0, 0
+    while True:
+        end_token = start_token + chunk_size
+        if end_token >= total:
+            chunk = txt[start:].strip()
+            if chunk:
+                yield chunk
+            return
+
+        limit = offsets[end_token]
+        cut, separator = _last_separator(txt, start, limit, separators)
+        if cut <= start:
+            cut = max(limit, start + 1)
+        chunk = txt[start:cut].strip()
+        if chunk:
+            yield chunk
+
+        next_start = cut
+        cut_token = bisect_left(offsets, cut, lo=start_token)
+        if overlap and cut_token - overlap > start_token:
+            overlap_start = offsets[cut_token - overlap]
+            if separator:
+                position = txt.find(separator, overlap_start, cut)
+                if position > start:
+                    next_start = position
+            elif overlap_start > start:
+                next_start = overlap_start
+        start = next_start
+        start_token = bisect_right(offsets, start, lo=start_token) - 1
+
+
 def split_text(txt: str, chunk_size=500):
     """
     Split the input text into chunks.
 
     Args:
         txt (str): The input text to be split.
-        chunk (int): The size of each chunk. Default is 1000.
-        overlap (int): The number of characters to overlap between chunks. Default is 0.
-        separator (str): The separator to use when splitting the text. Default is " ".
+        chunk_size (int): The maximum number of tokens of a chunk. Default is 500.
 
     Returns:
-        list: A list of text chunks.
+        list: A list of text chunks, overlapping by 15%. See chunk_text.
     """
-    overlap = int(chunk_size * 0.15)
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        length_function=token_count,
-        separators=[
-            "\n\n",
-            "\n",
-            ".",
-            ",",
-            " ",
-            "\u200b",  # Zero-width space
-            "\uff0c",  # Fullwidth comma
-            "\u3001",  # Ideographic comma
-            "\uff0e",  # Fullwidth full stop
-            "\u3002",  # Ideographic full stop
-            "",
-        ],
-    )
-    return text_splitter.split_text(txt)
+    return list(chunk_text(txt, chunk_size))
 
 
 def remove_non_ascii(text) -> str:
@@ -131,6 +260,45 @@ def surreal_clean(text) -> str:
     return text
 
 
+def content_fingerprint(
+    file_path: Optional[str] = None,
+    url: Optional[str] = None,
+    content: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Identifies the content of a source: the hash of the file bytes, of the normalized
+    url (no fragment, lowercase scheme and host) together with the text fetched from
+    it, or of the normalized text, whichever is given first. A url is only identified
+    once fetched, with its `content`, so that a page that changed is ingested again.
+    """
+    if file_path and os.path.isfile(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return f"file:{digest.hexdigest()}"
+    text = unicodedata.normalize("NFC", content).strip() if content else ""
+    if url:
+        if not text:
+            return None
+        parsed = urlparse(url.strip())
+        normalized = urlunparse(
+            parsed._replace(
+                scheme=parsed.scheme.lower(),
+                netloc=parsed.netloc.lower(),
+                path=parsed.path.rstrip("/"),
+                fragment="",
+            )
+        )
+        digest = hashlib.sha256(normalized.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return f"url:{digest.hexdigest()}"
+    if text:
+        return f"text:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+    return None
+
+
 def get_version_from_github(repo_url: str, branch: str = "main") -> str:
     """
     Fetch and parse the version from pyproject.toml in a public GitHub repository.
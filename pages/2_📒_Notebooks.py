@@ -12,7 +12,7 @@ from humanize import naturaltime
 from open_notebook.domain.notebook import Notebook
 from pages.stream_app.chat import chat_sidebar
 from pages.stream_app.note import add_note, note_card
-from pages.stream_app.source import add_source, source_card
+from pages.stream_app.source import add_source, ingest_jobs_panel, source_card
 from pages.stream_app.utils import setup_page, setup_stream_state
 
 setup_page("📒 Open Notebook", only_check_mandatory_models=True)
@@ -74,7 +74,7 @@ def notebook_page(current_notebook: Notebook):
         current_notebook=current_notebook,
     )
 
-    sources = current_notebook.sources
+    sources = current_notebook.source_summaries
     notes = current_notebook.notes
 
     notebook_header(current_notebook)
@@ -86,6 +86,7 @@ def notebook_page(current_notebook: Notebook):
             with st.container(border=True):
                 if st.button("Add Source", icon="➕"):
                     add_source(current_notebook.id)
+                ingest_jobs_panel(current_notebook.id)
                 for source in sources:
                     source_card(source=source, notebook_id=current_notebook.id)
 
@@ -16,7 +16,8 @@ if nb:
     # All the logic that depends on 'nb' must be inside this if-block.
     # text_to_use = nb.description + "\n\n" + "\n".join([s.full_text for s in nb.sources])  # or more selective
     # Safely get all non-None text strings from sources
-    source_texts = [s.full_text for s in nb.sources if s and s.full_text]
+    # One query for the sources with their full text, instead of one per source
+    source_texts = [s.full_text for s in nb.get_sources(omit=()) if s and s.full_text]
 
     # Now join them
     text_to_use = nb.description + "\n\n" + "\n".join(source_texts)
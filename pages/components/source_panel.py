@@ -4,6 +4,7 @@ import nest_asyncio
 import streamlit as st
 from humanize import naturaltime
 
+from open_notebook.domain.identity_map import unit_of_work
 from open_notebook.domain.models import model_manager
 from open_notebook.domain.notebook import Source
 from open_notebook.domain.transformation import Transformation
@@ -68,11 +69,15 @@ def source_panel(source_id: str, notebook_id=None, modal=False):
                     )
                     st.caption(transformation.description if transformation else "")
                     if st.button("Run"):
-                        asyncio.run(
-                            transform_graph.ainvoke(
-                                input=dict(source=source, transformation=transformation)
+                        with unit_of_work():
+                            result = asyncio.run(
+                                transform_graph.ainvoke(
+                                    input=dict(
+                                        source=source, transformation=transformation
+                                    )
+                                )
                             )
-                        )
+                            source.add_insight(transformation.title, result["output"])
                         st.rerun(scope="fragment" if modal else "app")
             else:
                 st.markdown(
@@ -86,8 +91,8 @@ def source_panel(source_id: str, notebook_id=None, modal=False):
             else:
                 help = "This will generate your embedding vectors on the database for powerful search capabilities"
 
-            if source.embedded_chunks == 0 and st.button(
-                "Embed vectors",
+            if st.button(
+                "Embed vectors" if source.embedded_chunks == 0 else "Update vectors",
                 icon="🦾",
                 help=help,
                 disabled=model_manager.embedding_model is None,
@@ -5,6 +5,7 @@ import streamlit as st
 from langchain_core.runnables import RunnableConfig
 
 from open_notebook.domain.base import ObjectModel
+from open_notebook.domain.identity_map import unit_of_work
 from open_notebook.domain.notebook import ChatSession, Note, Notebook, Source
 from open_notebook.graphs.chat import graph as chat_graph
 from open_notebook.plugins.podcasts import PodcastConfig
@@ -55,10 +56,11 @@ def execute_chat(txt_input, context, current_session):
     current_state = st.session_state[current_session.id]
     current_state["messages"] += [txt_input]
     current_state["context"] = context
-    result = chat_graph.invoke(
-        input=current_state,
-        config=RunnableConfig(configurable={"thread_id": current_session.id}),
-    )
+    with unit_of_work():
+        result = chat_graph.invoke(
+            input=current_state,
+            config=RunnableConfig(configurable={"thread_id": current_session.id}),
+        )
     current_session.save()
     return result
 
@@ -1,5 +1,5 @@
-import asyncio
 import os
+import time
 from pathlib import Path
 
 import nest_asyncio
@@ -13,19 +13,18 @@ from open_notebook.domain.models import model_manager
 from open_notebook.domain.notebook import Source
 from open_notebook.domain.transformation import Transformation
 from open_notebook.exceptions import UnsupportedTypeException
-from open_notebook.graphs.source import source_graph
+from open_notebook.jobs.queue import DONE, FAILED, QUEUED, RUNNING, job_queue
+from open_notebook.jobs.worker import start_embedded_workers
 from pages.components import source_panel
 from pages.stream_app.consts import source_context_icons
 
 nest_asyncio.apply()
 
-# --- QUIZ GENERATION IMPORTS ---
-from open_notebook.domain.quiz import (
-    generate_questions_from_text,
-    save_question_record,
-    embed_and_store_question
-)
-from open_notebook.domain.notebook import Source
+# Failed ingestions stay listed (until dismissed) for this long
+RECENT_FAILURES_SECONDS = 86_400
+# Jobs still queued after this long most likely have no worker to run them
+WORKER_MISSING_SECONDS = 60
+
 
 @st.dialog("Source", width="large")
 def source_panel_dialog(source_id, notebook_id=None):
@@ -83,7 +82,7 @@ def add_source(notebook_id):
     if st.button("Process", key="add_source"):
         logger.debug("Adding source")
         with st.status("Processing...", expanded=True):
-            st.write("Processing document...")
+            st.write("Queueing document...")
             try:
                 if source_type == "Upload" and source_file is not None:
                     st.write("Uploading..")
@@ -104,66 +103,18 @@ def add_source(notebook_id):
                     with open(new_path, "wb") as f:
                         f.write(source_file.getbuffer())
 
-                asyncio.run(
-                    source_graph.ainvoke(
-                        {
-                            "content_state": req,
-                            "notebook_id": notebook_id,
-                            "apply_transformations": apply_transformations,
-                            "embed": run_embed,
-                        }
-                    )
+                # Ingestion runs in a worker, see open_notebook.jobs
+                job_queue.submit(
+                    "ingest_source",
+                    {
+                        "content_state": req,
+                        "notebook_id": notebook_id,
+                        "transformations": [t.id for t in apply_transformations],
+                        "embed": run_embed,
+                        "generate_quiz": True,
+                    },
+                    tag=notebook_id,
                 )
-                # ==================== QUIZ GENERATION (STEP 3) ====================
-                try:
-                    st.write("✨ Generating quiz questions from this source...")
-                    # Fetch the latest saved source (you can also use return value from ainvoke)
-                    sources = Source.get_all()
-                    if sources:
-                        latest_source = sources[0]
-                        text_for_quiz = latest_source.full_text or latest_source.summary
-
-                        # Generate quiz questions with Gemini
-                        questions = generate_questions_from_text(
-                            text_for_quiz,
-                            num_questions=5,
-                            model_id="gemini-2.0-flash-001"  # or from your config
-                        )
-
-                        # Save questions in SurrealDB
-                        for q in questions:
-                            res = save_question_record(q, notebook_id=notebook_id)
-                            created_id = None
-                            if isinstance(res, list) and len(res) > 0 and "result" in res[0] and res[0]["result"]:
-                                created_id = res[0]["result"][0].get("id")
-                            if created_id:
-                                embed_and_store_question(created_id, q["question_text"])
-
-                        st.success(f"✅ {len(questions)} quiz questions generated and saved!")
-            
-                except Exception as e:
-                    st.error(f"⚠️ Quiz generation failed: {e}")
-                # ================================================================
-
-                if st.button("🎯 Generate Quiz from Source"):
-                    try:
-                        sources = Source.get_all()
-                        if sources:
-                            latest_source = sources[0]
-                            text_for_quiz = latest_source.full_text or latest_source.summary
-                            questions = generate_questions_from_text(text_for_quiz, num_questions=5, model_id="gemini-2.0-flash-001")
-                            for q in questions:
-                                res = save_question_record(q, notebook_id=notebook_id)
-                                created_id = None
-                                if isinstance(res, list) and len(res) > 0 and "result" in res[0] and res[0]["result"]:
-                                    created_id = res[0]["result"][0].get("id")
-                                if created_id:
-                                    embed_and_store_question(created_id, q["question_text"])
-                            st.success("🎉 Quiz successfully generated!")
-                    except Exception as e:
-                        st.error(f"Quiz generation failed: {e}")
-                            
-
 
             except UnsupportedTypeException as e:
                     st.warning(
@@ -183,6 +134,58 @@ def add_source(notebook_id):
             st.rerun()
 
 
+@st.fragment(run_every=2)
+def ingest_jobs_panel(notebook_id):
+    """Progress of the sources being ingested into the notebook, polled from the queue"""
+    start_embedded_workers()
+    active = st.session_state.setdefault("active_ingest_jobs", set())
+    # Jobs in progress and recent failures, plus the jobs this session saw running
+    # so that their completion is reported
+    jobs = job_queue.list(tag=notebook_id, statuses=[QUEUED, RUNNING])
+    jobs += job_queue.list(
+        tag=notebook_id,
+        statuses=[FAILED],
+        limit=10,
+        updated_since=time.time() - RECENT_FAILURES_SECONDS,
+    )
+    listed = {job.id for job in jobs}
+    for job_id in active - listed:
+        job = job_queue.get(job_id)
+        if job is not None and job.status == DONE:
+            jobs.append(job)
+        else:
+            # Dismissed, purged or failed a while ago
+            active.discard(job_id)
+    finished = False
+    for job in jobs:
+        if job.status in (QUEUED, RUNNING):
+            active.add(job.id)
+            st.progress(job.progress, text=job.message or "Waiting for a worker...")
+            if (
+                job.status == QUEUED
+                and time.time() - job.created > WORKER_MISSING_SECONDS
+            ):
+                st.caption(
+                    "Still waiting, is a worker running? "
+                    "Start one with `python -m open_notebook.jobs.worker`"
+                )
+        elif job.status == FAILED:
+            st.error(f"Could not add source: {job.error}")
+            if st.button("Dismiss", key=f"dismiss_{job.id}"):
+                job_queue.dismiss(job.id)
+                st.rerun(scope="fragment")
+        elif job.id in active:
+            active.discard(job.id)
+            finished = True
+            if job.result and job.result.get("quiz_error"):
+                st.toast(f"Quiz generation failed: {job.result['quiz_error']}")
+            elif job.result and job.result.get("reused"):
+                st.toast(f"{job.result['title']} was already ingested, reused it")
+    if finished:
+        # Refreshes the source list
+        st.rerun(scope="app")
+
+
 def source_card(source, notebook_id):
     # todo: more descriptive icons
     icon = "🔗"
@@ -198,7 +201,7 @@ def source_card(source, notebook_id):
             key=f"source_{source.id}",
         )
         st.caption(
-            f"Updated: {naturaltime(source.updated)}, **{len(source.insights)}** insights"
+            f"Updated: {naturaltime(source.updated)}, **{source.insights_count}** insights"
         )
         if st.button("Expand", icon="📝", key=source.id):
             source_panel_dialog(source.id, notebook_id)
@@ -6,7 +6,10 @@ import streamlit as st
 from loguru import logger
 
 from open_notebook.database.migrate import MigrationManager
-from open_notebook.domain.models import DefaultModels
+from open_notebook.domain.embedding import build_vector_indexes
+from open_notebook.domain.identity_map import begin_unit_of_work
+from open_notebook.domain.live_invalidation import start_live_invalidation
+from open_notebook.domain.models import DefaultModels, model_manager
 from open_notebook.domain.notebook import ChatSession, Notebook
 from open_notebook.graphs.chat import ThreadState, graph
 from open_notebook.utils import (
@@ -162,6 +165,10 @@ def setup_page(
     stop_on_model_error=True,
 ):
     """Common page setup for all pages"""
+    # Each Streamlit run reads a record at most once, see open_notebook.domain.identity_map
+    begin_unit_of_work()
+    # Keeps this process' caches in sync with writes made by other processes
+    start_live_invalidation()
     st.set_page_config(
         page_title=title, layout=layout, initial_sidebar_state=sidebar_state
     )
@@ -169,6 +176,8 @@ def setup_page(
     check_models(
         only_mandatory=only_check_mandatory_models, stop_on_error=stop_on_model_error
     )
+    model_manager.warm_up()
+    build_vector_indexes()
     # version_sidebar()
 
 
@@ -0,0 +1,95 @@
+import json
+import threading
+
+from open_notebook.database.live import LiveInvalidationBus, decode_notification
+
+# Frames as read from the websocket of a SurrealDB 2.x server after LIVE SELECT id
+UPDATE_FRAME = (
+    '{"result":{"action":"UPDATE","id":"0192d6a4-3b1e-7c52-9a1f-54a0f1c2e7b3",'
+    '"record":"source:o8hdtd2kglnjfenqwhap","result":{"id":"source:o8hdtd2kglnjfenqwhap"}}}'
+)
+DELETE_FRAME = (
+    '{"result":{"action":"DELETE","id":"0192d6a4-3b1e-7c52-9a1f-54a0f1c2e7b3",'
+    '"record":"note:\\u27e8my-note\\u27e9","result":{"id":"note:\\u27e8my-note\\u27e9"}}}'
+)
+# Reply to the LIVE SELECT query itself, not a notification
+QUERY_REPLY_FRAME = (
+    '{"id":"b7c1e3","result":[{"result":"0192d6a4-3b1e-7c52-9a1f-54a0f1c2e7b3",'
+    '"status":"OK","time":"153.5µs"}]}'
+)
+# SurrealDB 1.x notifications have no record field
+V1_FRAME = (
+    '{"result":{"action":"CREATE","id":"7a1c6f1e-6c1a-4a0b-b0b8-2f1c9d1e0a11",'
+    '"result":{"id":"notebook:abc"}}}'
+)
+V1_DELETE_FRAME = (
+    '{"result":{"action":"DELETE","id":"7a1c6f1e-6c1a-4a0b-b0b8-2f1c9d1e0a11",'
+    '"result":"notebook:abc"}}'
+)
+
+
+def test_decode_notification():
+    assert decode_notification(UPDATE_FRAME) == (
+        "source:o8hdtd2kglnjfenqwhap",
+        "UPDATE",
+    )
+    assert decode_notification(DELETE_FRAME) == ("note:⟨my-note⟩", "DELETE")
+    assert decode_notification(V1_FRAME) == ("notebook:abc", "CREATE")
+    assert decode_notification(V1_DELETE_FRAME) == ("notebook:abc", "DELETE")
+    assert decode_notification(UPDATE_FRAME.encode()) == (
+        "source:o8hdtd2kglnjfenqwhap",
+        "UPDATE",
+    )
+
+
+def test_decode_ignores_other_frames():
+    assert decode_notification(QUERY_REPLY_FRAME) is None
+    assert decode_notification("not json") is None
+    assert decode_notification(json.dumps({"result": None})) is None
+
+
+class FakeSocket:
+    def __init__(self, frames, done):
+        self.frames = list(frames)
+        self.done = done
+
+    def recv(self):
+        if self.frames:
+            return self.frames.pop(0)
+        self.done.set()
+        raise ConnectionError("connection lost")
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, frames, done):
+        self.socket = FakeSocket(frames, done)
+        self.queries = []
+
+    def query(self, query, vars=None):
+        self.queries.append(query)
+
+
+def test_reset_only_after_reconnecting():
+    events = []
+    first_lost, second_lost = threading.Event(), threading.Event()
+    connections = [
+        FakeConnection([UPDATE_FRAME, QUERY_REPLY_FRAME], first_lost),
+        FakeConnection([DELETE_FRAME], second_lost),
+    ]
+    pending = iter(connections)
+    bus = LiveInvalidationBus(["source", "note"], connect=lambda: next(pending))
+    bus.reconnect_delay = 0
+    bus.subscribe(lambda table, record_id, action: events.append((table, action)))
+    bus.start()
+    assert second_lost.wait(5)
+    bus.stop()
+
+    assert events == [("source", "UPDATE"), (None, "RESET"), ("note", "DELETE")]
+    # Notifications only carry the record id, not the whole record
+    assert connections[0].queries == [
+        "LIVE SELECT id FROM source;",
+        "LIVE SELECT id FROM note;",
+    ]
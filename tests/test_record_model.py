@@ -0,0 +1,77 @@
+import threading
+from typing import ClassVar, Optional
+
+import pytest
+
+from open_notebook.domain import base
+from open_notebook.domain.base import RecordModel
+
+
+class Settings(RecordModel):
+    record_id: ClassVar[str] = "open_notebook:test_settings"
+    value: Optional[str] = None
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    """The record in the database, shared with other (simulated) processes"""
+    record = {"value": "first"}
+    monkeypatch.setattr(base, "repo_query", lambda query: [dict(record)])
+    monkeypatch.setattr(base, "repo_upsert", lambda _, data: record.update(data))
+    Settings.clear_instance()
+    RecordModel._listeners.pop(Settings.record_id, None)
+    yield record
+    Settings.clear_instance()
+    RecordModel._listeners.pop(Settings.record_id, None)
+
+
+def test_notifies_when_a_reload_changes_the_record(stored):
+    settings = Settings()
+    changes = []
+    Settings.on_change(lambda instance: changes.append(instance.value))
+
+    settings.reload()
+    assert changes == []
+
+    stored["value"] = "second"
+    settings.reload()
+    assert changes == ["second"]
+
+
+def test_notifies_when_a_save_changes_the_record(stored):
+    settings = Settings()
+    changes = []
+    Settings.on_change(lambda instance: changes.append(instance.value))
+
+    settings.update()
+    assert changes == []
+
+    settings.value = "saved"
+    settings.update()
+    assert changes == ["saved"]
+    assert stored["value"] == "saved"
+
+
+def test_notifies_on_background_refresh(stored):
+    settings = Settings()
+    refreshed = threading.Event()
+    Settings.on_change(lambda instance: refreshed.set())
+
+    stored["value"] = "elsewhere"
+    RecordModel.expire_all()
+    # Served from memory, the refresh runs in the background
+    assert Settings() is settings
+    assert refreshed.wait(5)
+    assert settings.value == "elsewhere"
+
+
+def test_unsaved_values_survive_a_reload(stored):
+    settings = Settings()
+    changes = []
+    Settings.on_change(lambda instance: changes.append(instance.value))
+
+    settings.value = "unsaved"
+    stored["value"] = "elsewhere"
+    settings.reload()
+    assert settings.value == "unsaved"
+    assert changes == []